@@ -1,35 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.future import select
 
-from app.models.user import UserLogin, UserCreate, UserRead, Token, User
-from app.services.auth import create_user, login_user
+from app.models.user import UserLogin, UserCreate, UserRead, Token
+from app.services.auth import create_user, login_user, get_current_user, token_claims
 from app.db.session import get_session
 
-from app.core.security import create_access_token, verify_access_token
+from app.core.security import create_access_token
 
 
-from fastapi.security import OAuth2PasswordBearer
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
 router = APIRouter()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_session)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    payload = verify_access_token(token)
-    user_id = payload.get("sub")
-    if user_id is None:
-        raise credentials_exception
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if user is None:
-        raise credentials_exception
-    return user
-
 @router.post("/signup", response_model=UserRead, status_code=status.HTTP_201_CREATED)
 async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_session)):
     try:
@@ -46,5 +26,5 @@ async def login(login_data: UserLogin, db: AsyncSession = Depends(get_session)):
     user = await login_user(login_data.email, login_data.password, db)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    access_token = create_access_token(data={"sub": str(user.id)})
+    access_token = create_access_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -1,108 +1,214 @@
-import boto3
-import boto3.dynamodb.types
-from typing import Any
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Path
+from typing import Any, Optional
+from uuid import UUID
+from itertools import islice
+from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException, Query, Request, status, Path
+from fastapi.responses import FileResponse, RedirectResponse
+from PIL import UnidentifiedImageError
+from PIL.Image import DecompressionBombError
+from pydantic import BaseModel, Field
 from sqlalchemy.future import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.services.image import save_image
+from app.services.image import save_image, remove_image
+from app.services.storage import UploadTooLarge, s3_key_from_uri
 from app.core.config import settings
-from app.models import Image, ImageRead
+from app.models import Blob, Image, ImageRead, UploadSession, UploadSessionRead
 from app.models.user import User
-from app.api.v1.auth import get_current_user
+from app.services.auth import get_current_user
+from app.db.replicas import get_read_session
 from app.db.session import get_session
+from app.services.analysis import BATCH_GET_LIMIT, AnalysisStore, get_analysis_store, owned_summaries
+from app.services.analysis_worker import AnalysisWorker, get_analysis_worker
+from app.services.aws import AWSClients, get_aws
+from app.services.derivatives import DERIVATIVE_CONTENT_TYPE, DerivativeStore, derivative_path, get_derivatives
+from app.services.presign import PresignedUrlCache, get_presigned_urls
+from app.services.similarity import SimilarityIndex, get_similarity_index
+from app.services.uploads import (
+    InvalidChunk, UploadConflict, UploadGone, UploadIncomplete, abort_upload, create_upload, describe_upload, finalize_upload,
+    get_upload, write_chunk,
+)
 
 router = APIRouter()
 
 @router.delete("/images/{image_id}", status_code=204)
 async def delete_image(
-    image_id: str = Path(..., description="The ID of the image to delete"),
+    image_id: UUID = Path(..., description="The ID of the image to delete"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+    derivatives: DerivativeStore = Depends(get_derivatives),
+    similarity: SimilarityIndex = Depends(get_similarity_index)
 ):
     # Fetch image
     result = await db.execute(select(Image).where(Image.id == image_id, Image.user_id == current_user.id))
     image = result.scalar_one_or_none()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
-    # If S3, delete from S3
-    if image.file_path.startswith("s3://"):
-        s3_key = image.file_path.split("/", 3)[-1]
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION,
-        )
-        try:
-            s3_client.delete_object(Bucket=settings.AWS_S3_BUCKET_NAME, Key=s3_key)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to delete from S3: {e}")
-    # Delete from DB
-    await db.delete(image)
-    await db.commit()
+    try:
+        await remove_image(image, db, aws, derivatives)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete image: {e}")
+    similarity.removed(image)
     return None
 
 
-def generate_presigned_url(s3_key: str, expires_in=3600):
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
-    )
-    return s3_client.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": settings.AWS_S3_BUCKET_NAME, "Key": s3_key},
-        ExpiresIn=expires_in,
-    )
-
-
-
 @router.post("/upload-image", response_model=ImageRead)
 async def upload_image(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+    analysis_worker: Optional[AnalysisWorker] = Depends(get_analysis_worker),
+    similarity: SimilarityIndex = Depends(get_similarity_index)
 ) -> Any:
-    if settings.ENV == "production":
-        # Upload to S3
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION,
+    try:
+        # Production keeps blobs in S3, everything else on local disk
+        image = await save_image(
+            user_id=current_user.id,
+            file=file,
+            db=db,
+            aws=aws if settings.ENV == "production" else None,
         )
-        s3_key = file.filename
-        file.file.seek(0)
-        s3_client.upload_fileobj(file.file, settings.AWS_S3_BUCKET_NAME, s3_key, ExtraArgs={"ContentType": file.content_type})
-        image = Image(file_path=f"s3://{settings.AWS_S3_BUCKET_NAME}/{s3_key}", user_id=current_user.id)
-        db.add(image)
-        await db.commit()
-        await db.refresh(image)
-        return image
-    else:
-        # Local upload
-        image = await save_image(user_id=current_user.id, file=file, db=db)
-        if not image:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Image upload failed.")
-        return image
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    if not image:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Image upload failed.")
+    similarity.added(image)
+    if analysis_worker is not None:
+        analysis_worker.notify()
+    return image
+
+
+class UploadSessionCreate(BaseModel):
+    size: int = Field(..., gt=0, description="Total bytes that will be uploaded")
+    content_type: Optional[str] = None
+
+
+async def _own_upload(upload_id: UUID, user: User, db: AsyncSession) -> UploadSession:
+    upload = await get_upload(db, upload_id, user.id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+@router.post("/uploads", response_model=UploadSessionRead, status_code=201)
+async def start_upload(
+    body: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+):
+    """
+    Start a resumable upload. Send the bytes with PATCH /uploads/{id}, each
+    request one `chunk_size` chunk (the last may be shorter) with its byte
+    offset in Upload-Offset; chunks can go in any order and in parallel.
+    GET /uploads/{id} gives the offset to resume from, then POST
+    /uploads/{id}/complete creates the image.
+    """
+    try:
+        upload = await create_upload(
+            db, current_user.id, body.size, body.content_type, aws=aws if settings.ENV == "production" else None
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    return await describe_upload(db, upload)
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionRead)
+async def upload_chunk(
+    request: Request,
+    upload_id: UUID = Path(..., description="The upload session ID"),
+    upload_offset: int = Header(..., alias="Upload-Offset", description="Byte offset of this chunk"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+):
+    upload = await _own_upload(upload_id, current_user, db)
+    try:
+        await write_chunk(db, upload, upload_offset, request.stream(), aws)
+    except InvalidChunk as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return await describe_upload(db, upload)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionRead)
+async def get_upload_status(
+    upload_id: UUID = Path(..., description="The upload session ID"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+):
+    # From the primary: a replica may not have the chunks that were just acknowledged
+    return await describe_upload(db, await _own_upload(upload_id, current_user, db))
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=ImageRead)
+async def complete_upload(
+    upload_id: UUID = Path(..., description="The upload session ID"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+    analysis_worker: Optional[AnalysisWorker] = Depends(get_analysis_worker),
+    similarity: SimilarityIndex = Depends(get_similarity_index)
+):
+    """
+    Create the image from the uploaded chunks. Retrying after success returns
+    the same image (410 if it has since been deleted); a call made while
+    another is still finalizing gets 409 and should retry.
+    """
+    upload = await _own_upload(upload_id, current_user, db)
+    try:
+        image = await finalize_upload(db, upload, aws)
+    except UploadIncomplete as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"message": str(e), "missing": e.missing})
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except UploadGone as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    except InvalidChunk as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    similarity.added(image)
+    if analysis_worker is not None:
+        analysis_worker.notify()
+    return image
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_upload(
+    upload_id: UUID = Path(..., description="The upload session ID"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    aws: AWSClients = Depends(get_aws),
+):
+    upload = await _own_upload(upload_id, current_user, db)
+    try:
+        await abort_upload(db, upload, aws)
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return None
 
 
 
 @router.get("/images", response_model=list[ImageRead])
 async def list_my_images(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session),
+    presigned_urls: PresignedUrlCache = Depends(get_presigned_urls),
+    derivatives: DerivativeStore = Depends(get_derivatives)
 ):
-    result = await db.execute(select(Image).where(Image.user_id == current_user.id))
-    images = result.scalars().all()
+    result = await db.execute(
+        select(Image, Blob.content_hash, Blob.storage_path)
+        .outerjoin(Blob, Blob.id == Image.blob_id)
+        .where(Image.user_id == current_user.id)
+    )
     # Build ImageRead list with presigned_url
     image_reads = []
-    for image in images:
+    for image, content_hash, storage_path in result.all():
         if image.file_path.startswith("s3://"):
             s3_key = image.file_path.split("/", 3)[-1]
-            presigned_url = generate_presigned_url(s3_key)
+            presigned_url = presigned_urls.get_url(s3_key)
         else:
             presigned_url = image.file_path
         image_reads.append(ImageRead(
@@ -111,75 +217,152 @@ async def list_my_images(
             updated_at=image.updated_at,
             file_path=image.file_path,
             user_id=image.user_id,
-            presigned_url=presigned_url
+            presigned_url=presigned_url,
+            derivatives=_derivative_urls(request, presigned_urls, derivatives, content_hash, storage_path),
         ))
     return image_reads
 
 
-def extract_strings(data, keys=("Categories", "Name", "Parents")):
+def _derivative_urls(
+    request: Request,
+    presigned_urls: PresignedUrlCache,
+    derivatives: DerivativeStore,
+    content_hash: Optional[str],
+    storage_path: Optional[str],
+) -> dict[str, str]:
     """
-    Recursively extract all string values for the given keys from nested dict/list structures.
-    Returns a dict of key -> set of found strings.
+    Presigned S3 URLs, which an <img> can load straight from S3, for blobs in
+    S3; the authenticated derivative route for blobs on local disk.
     """
-    result = {k: set() for k in keys}
-    if isinstance(data, dict):
-        for k, v in data.items():
-            for key in keys:
-                if k == key:
-                    if isinstance(v, str):
-                        result[key].add(v)
-                    elif isinstance(v, list):
-                        for item in v:
-                            if isinstance(item, dict) and "Name" in item:
-                                result[key].add(item["Name"])
-                            elif isinstance(item, str):
-                                result[key].add(item)
-                    elif isinstance(v, dict) and "Name" in v:
-                        result[key].add(v["Name"])
-            # Recurse into all values
-            sub_result = extract_strings(v, keys)
-            for key in keys:
-                result[key].update(sub_result[key])
-    elif isinstance(data, list):
-        for item in data:
-            sub_result = extract_strings(item, keys)
-            for key in keys:
-                result[key].update(sub_result[key])
-    return result
+    if content_hash is None:
+        return {}
+    if storage_path.startswith("s3://"):
+        return {
+            name: presigned_urls.get_url(s3_key_from_uri(derivative_path(storage_path, name)))
+            for name in derivatives.sizes
+        }
+    return {
+        name: str(request.url_for("get_image_derivative", content_hash=content_hash, name=name))
+        for name in derivatives.sizes
+    }
 
-@router.get("/get-image-analysis/{image_id}")
-async def get_image_analysis(
-    image_id: str = Path(..., description="The image ID to look up in DynamoDB"),
-    current_user: User = Depends(get_current_user)
+
+@router.get("/derivatives/{content_hash}/{name}", name="get_image_derivative")
+async def get_image_derivative(
+    content_hash: str = Path(..., pattern="^[0-9a-f]{64}$", description="Content hash of the original"),
+    name: str = Path(..., description="Derivative name, e.g. 'thumb' or 'preview'"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    presigned_urls: PresignedUrlCache = Depends(get_presigned_urls),
+    derivatives: DerivativeStore = Depends(get_derivatives)
 ):
-    # Create DynamoDB client
-    dynamodb = boto3.client(
-        "dynamodb",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
+    """
+    A resized copy of one of the caller's images, rendered on first request if
+    missing. Addressed by content hash, so the response never changes, but
+    only served to users with an image of that content. Image listings link
+    here only for local storage; S3 derivatives are listed as presigned URLs.
+    """
+    if name not in derivatives.sizes:
+        raise HTTPException(status_code=404, detail="Unknown derivative")
+    result = await db.execute(
+        select(Blob.storage_path)
+        .join(Image, Image.blob_id == Blob.id)
+        .where(Blob.content_hash == content_hash, Image.user_id == current_user.id)
+        .limit(1)
     )
-
-    # If your table uses user_id as partition key and image_id as sort key:
-    response = dynamodb.get_item(
-        TableName="imageanalysis",
-        Key={
-            "image-id": {"S": image_id}
-        }
+    storage_path = result.scalar_one_or_none()
+    if storage_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        path = await derivatives.ensure(storage_path, name)
+    except (OSError, UnidentifiedImageError, DecompressionBombError):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Image could not be resized")
+    if path.startswith("s3://"):
+        # The presigned URL is good for at least the safety margin, so the redirect may be cached that long
+        return RedirectResponse(
+            presigned_urls.get_url(s3_key_from_uri(path)),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": f"private, max-age={settings.PRESIGNED_URL_SAFETY_MARGIN}"},
+        )
+    return FileResponse(
+        path,
+        media_type=DERIVATIVE_CONTENT_TYPE,
+        # Private: user content behind a login must not be kept by shared caches
+        headers={"Cache-Control": f"private, max-age={settings.IMAGE_DERIVATIVE_MAX_AGE}, immutable"},
     )
 
-    item = response.get("Item")
-    if not item or "results" not in item:
-        raise HTTPException(status_code=404, detail="Analysis not found for this image_id")
 
-    deserializer = boto3.dynamodb.types.TypeDeserializer()
-    results = deserializer.deserialize(item["results"])
+class SimilarImage(BaseModel):
+    image_id: UUID
+    distance: int
 
-    # Extract comma-separated strings
-    extracted = extract_strings(results)
-    response_strings = {k: ", ".join(sorted(v)) for k, v in extracted.items()}
+
+@router.get("/similar/{image_id}", response_model=list[SimilarImage])
+async def find_similar_images(
+    image_id: UUID = Path(..., description="The image to find near-duplicates of"),
+    max_distance: int = Query(settings.SIMILARITY_DEFAULT_MAX_DISTANCE, ge=0, le=64, description="Maximum Hamming distance between 64-bit dHashes"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+    similarity: SimilarityIndex = Depends(get_similarity_index)
+):
+    """The user's other images whose perceptual hash is within max_distance bits, nearest first."""
+    result = await db.execute(select(Image.phash).where(Image.id == image_id, Image.user_id == current_user.id))
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if row.phash is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Image has no perceptual hash")
+    index = await similarity.for_user(current_user.id)
+    matches = (match for match in index.search(row.phash, max_distance) if match[1] != image_id)
+    return [SimilarImage(image_id=key, distance=distance) for distance, key in islice(matches, limit)]
+
+
+class ImageAnalysisBatchIn(BaseModel):
+    image_ids: list[str] = Field(..., min_length=1, max_length=BATCH_GET_LIMIT)
+
+
+@router.get("/get-image-analysis/{image_id}")
+async def get_image_analysis(
+    image_id: str = Path(..., description="The image ID to look up in DynamoDB"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
+    analysis: AnalysisStore = Depends(get_analysis_store)
+):
+    stored = await owned_summaries(db, current_user.id, [image_id])
+    if image_id not in stored:
+        raise HTTPException(status_code=404, detail="Image not found")
+    extracted = stored[image_id] or await analysis.get(image_id)
+    if extracted is None:
+        raise HTTPException(status_code=404, detail="Analysis not found for this image_id")
 
     return {
         "image_id": image_id,
-        "extracted": response_strings
+        "extracted": extracted
+    }
+
+
+@router.post("/get-image-analysis/batch")
+async def get_image_analyses(
+    data: ImageAnalysisBatchIn,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_session),
+    analysis: AnalysisStore = Depends(get_analysis_store)
+):
+    stored = await owned_summaries(db, current_user.id, data.image_ids)
+    missing = [image_id for image_id, extracted in stored.items() if extracted is None]
+    fetched = await analysis.get_many(missing) if missing else {}
+    found = {
+        image_id: stored[image_id] or fetched.get(image_id)
+        for image_id in dict.fromkeys(data.image_ids) if image_id in stored
+    }
+    return {
+        "analyses": [
+            {"image_id": image_id, "extracted": extracted}
+            for image_id, extracted in found.items() if extracted is not None
+        ],
+        # Not analysed yet (or not readable right now); ask again later
+        "pending": [image_id for image_id, extracted in found.items() if extracted is None],
+        # Not one of the caller's images
+        "not_found": [image_id for image_id in dict.fromkeys(data.image_ids) if image_id not in stored],
     }
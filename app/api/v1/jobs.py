@@ -1,17 +1,28 @@
-from typing import List, Optional, Dict, Any
-from datetime import date, datetime, timedelta
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from pydantic import BaseModel
+from typing import List, Literal, Optional, Dict, Any
+from datetime import date
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, status, UploadFile, File
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, tuple_
 from sqlalchemy.exc import IntegrityError
 import uuid
 
+from app.core.config import settings
+from app.db.dialect import count_rows
+from app.db.replicas import get_read_session
 from app.db.session import get_session
 from app.models.jobs import NHSJob, UserJobAction, JobActionEnum
-from app.services.auth import get_current_user
-from app.services.dependencies import PaginationParams, pagination_params
+from app.services.auth import get_current_user, get_admin_user
+from app.services.job_cache import JobResponseCache, cached_page, get_job_cache, store_page
+from app.services.ingest import IngestResult, ingest_jobs, open_upload
+from app.services.job_stats import count_job_actions, record_job_action
+from app.services.jobs import (
+    JOB_OUT_COLUMNS, apply_job_actions, available_jobs_query, search_relevance,
+    serialize_job_rows, use_fulltext,
+)
+from app.services.dependencies import PaginationParams, pagination_params, cursor_params, encode_cursor
 
 
 
@@ -32,113 +43,119 @@ class JobOut(BaseModel):
 
 router = APIRouter()
 
-def format_date(dt: date) -> str:
-    if not dt:
-        return ""
-    return dt.strftime("%d %B %Y")  # e.g., "11 July 2025"
-
-
-@router.get("/all", response_model=Dict[str, Any])
+@router.get("/all", response_model=Dict[str, Any], response_class=ORJSONResponse)
 async def list_jobs(
+    request: Request,
     sponsored: Optional[bool] = Query(None, description="Filter by sponsorship"),
-    sort: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort by closing date: 'asc' or 'desc'"),
-    search: Optional[str] = Query(None, description="Search by job title"),
-    db: AsyncSession = Depends(get_session),
+    sort: Optional[str] = Query("asc", regex="^(asc|desc|relevance)$", description="Sort by closing date: 'asc' or 'desc', or by search 'relevance'"),
+    search: Optional[str] = Query(None, description="Search job titles (and addresses on Postgres); words match as prefixes for typeahead"),
+    count: str = Query("exact", regex="^(exact|estimate)$", description="'estimate' allows a planner estimate for large totals"),
+    db: AsyncSession = Depends(get_read_session),
     current_user=Depends(get_current_user),
-    pagination: PaginationParams = Depends(pagination_params)
+    pagination: PaginationParams = Depends(pagination_params),
+    cursor: Optional[list] = Depends(cursor_params),
+    job_cache: JobResponseCache = Depends(get_job_cache)
 ):
-    # Get job_ids that the user has already taken action on
-    user_actions_result = await db.execute(
-        select(UserJobAction.job_id).where(UserJobAction.user_id == current_user.id)
-    )
-    excluded_job_ids = [row[0] for row in user_actions_result.all()]
-
-    # Build base query for NHSJob
-    base_query = select(NHSJob)
-    if sponsored is not None:
-        base_query = base_query.where(NHSJob.sponsored == sponsored)
-    if excluded_job_ids:
-        base_query = base_query.where(NHSJob.id.notin_(excluded_job_ids))
-    if search:
-        base_query = base_query.where(NHSJob.title.ilike(f"%{search}%"))
+    etag, response = await cached_page(request, db, current_user.id, job_cache)
+    if response is not None:
+        return response
 
-    # Filter jobs where closing_date is in the future (>= now)
-    now = datetime.now()
-    base_query = base_query.where(NHSJob.closing_date >= now)
+    fulltext = use_fulltext(db)
+    base_query = available_jobs_query(current_user.id, sponsored=sponsored, search=search, fulltext=fulltext)
+    if sort == "relevance" and not search:
+        sort = "asc"
 
     # Get total count before pagination
-    count_result = await db.execute(base_query.with_only_columns(NHSJob.id))
-    total = len(count_result.scalars().all())
+    total, total_estimated = await count_rows(
+        db,
+        base_query,
+        estimate_above=settings.JOBS_COUNT_ESTIMATE_THRESHOLD if count == "estimate" else None,
+    )
 
-    # Apply sorting and pagination
-    query = base_query
-    if sort == "asc":
-        query = query.order_by(asc(NHSJob.closing_date))
+    # Apply sorting and pagination; id breaks closing_date ties so keyset pages are stable
+    query = base_query.with_only_columns(*JOB_OUT_COLUMNS)
+    if sort == "relevance":
+        query = query.order_by(search_relevance(search, fulltext), asc(NHSJob.closing_date), asc(NHSJob.id))
+    elif sort == "asc":
+        query = query.order_by(asc(NHSJob.closing_date), asc(NHSJob.id))
+    else:
+        query = query.order_by(desc(NHSJob.closing_date), desc(NHSJob.id))
+    if cursor is not None and sort != "relevance":
+        try:
+            position = (date.fromisoformat(cursor[0]), uuid.UUID(cursor[1]))
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+        keyset = tuple_(NHSJob.closing_date, NHSJob.id)
+        position = tuple_(*position)
+        query = query.where(keyset > position if sort == "asc" else keyset < position)
     else:
-        query = query.order_by(desc(NHSJob.closing_date))
-    query = query.offset(pagination.skip).limit(pagination.limit)
+        query = query.offset(pagination.skip)
+    query = query.limit(pagination.limit)
 
     result = await db.execute(query)
-    jobs = result.scalars().all()
-    job_list = []
-    for job in jobs:
-        job_dict = job.__dict__.copy()
-        job_dict["id"] = job.id  # keep as UUID, not str
-        job_dict["date_posted"] = format_date(job.date_posted)
-        job_dict["closing_date"] = format_date(job.closing_date)
-        job_dict.pop("_sa_instance_state", None)
-        job_list.append(JobOut(**job_dict))
-    return {
+    jobs = result.all()
+    next_cursor = None
+    # Relevance ranks are not a stable keyset, so those pages use skip
+    if len(jobs) == pagination.limit and sort != "relevance":
+        next_cursor = encode_cursor(jobs[-1].closing_date, jobs[-1].id)
+    # Already in JobOut's shape; returning the response directly skips a second validation pass
+    return store_page(request, current_user.id, job_cache, etag, {
         "total": total,
-        "jobs": job_list
-    }
+        "total_estimated": total_estimated,
+        "next_cursor": next_cursor,
+        "jobs": serialize_job_rows(jobs)
+    })
 
 
-@router.get("/user-jobs", response_model=List[JobOut])
+@router.get("/user-jobs", response_model=List[JobOut], response_class=ORJSONResponse)
 async def list_user_jobs(
+    request: Request,
     action: JobActionEnum = Query(JobActionEnum.APPLIED, description="Filter by action: 'applied' or 'ignored'"),
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user=Depends(get_current_user),
-    pagination: PaginationParams = Depends(pagination_params)
+    pagination: PaginationParams = Depends(pagination_params),
+    job_cache: JobResponseCache = Depends(get_job_cache)
 ):
+    etag, response = await cached_page(request, db, current_user.id, job_cache)
+    if response is not None:
+        return response
+
     result = await db.execute(
-        select(UserJobAction)
+        select(*JOB_OUT_COLUMNS)
+        .join(UserJobAction, UserJobAction.job_id == NHSJob.id)
         .where(
             UserJobAction.user_id == current_user.id,
             UserJobAction.action == action
         )
+        .order_by(desc(UserJobAction.timestamp))
         .offset(pagination.skip)
         .limit(pagination.limit)
     )
-    actions = result.scalars().all()
-    job_ids = [action.job_id for action in actions]
-    if not job_ids:
-        return []
-
-    jobs_result = await db.execute(
-        select(NHSJob).where(NHSJob.id.in_(job_ids))
-    )
-    jobs = jobs_result.scalars().all()
-    job_list = []
-    for job in jobs:
-        job_dict = job.__dict__.copy()
-        job_dict["id"] = job.id  # keep as UUID, not str
-        job_dict["date_posted"] = format_date(job.date_posted)
-        job_dict["closing_date"] = format_date(job.closing_date)
-        job_dict.pop("_sa_instance_state", None)
-        job_list.append(JobOut(**job_dict))
-    return job_list
+    return store_page(request, current_user.id, job_cache, etag, serialize_job_rows(result.all()))
 
 
 class UserJobActionIn(BaseModel):
     job_id: uuid.UUID
     action: JobActionEnum
 
+
+class UserJobActionBatchIn(BaseModel):
+    items: List[UserJobActionIn] = Field(..., min_length=1, max_length=500)
+    # "ignore" keeps an existing action for the job, "update" replaces it
+    on_conflict: Literal["ignore", "update"] = "ignore"
+
+
+class UserJobActionOutcome(BaseModel):
+    job_id: uuid.UUID
+    action: JobActionEnum
+    status: Literal["created", "updated", "exists", "unknown_job"]
+
 @router.post("/user-jobs", status_code=201)
 async def create_user_job_action(
     data: UserJobActionIn,
     db: AsyncSession = Depends(get_session),
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_current_user),
+    job_cache: JobResponseCache = Depends(get_job_cache)
 ):
     # Check if the action already exists for this user and job
     result = await db.execute(
@@ -160,6 +177,8 @@ async def create_user_job_action(
     )
     db.add(user_job_action)
     try:
+        await db.flush()
+        await record_job_action(db, current_user.id, data.action, user_job_action.timestamp.date())
         await db.commit()
     except IntegrityError:
         await db.rollback()
@@ -167,55 +186,41 @@ async def create_user_job_action(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid job_id or user_id."
         )
+    job_cache.invalidate_user(current_user.id)
     return {"message": "User job action created."}
 
+@router.post("/user-jobs/batch", response_model=List[UserJobActionOutcome])
+async def create_user_job_actions(
+    data: UserJobActionBatchIn,
+    db: AsyncSession = Depends(get_session),
+    current_user=Depends(get_current_user),
+    job_cache: JobResponseCache = Depends(get_job_cache)
+):
+    # The last entry wins when a job appears more than once
+    actions = {item.job_id: item.action for item in data.items}
+    outcomes = await apply_job_actions(db, current_user.id, actions, overwrite=data.on_conflict == "update")
+    job_cache.invalidate_user(current_user.id)
+    return [
+        UserJobActionOutcome(job_id=job_id, action=action, status=outcomes[job_id])
+        for job_id, action in actions.items()
+    ]
+
 @router.get("/jobs-count")
 async def count_applied_jobs(
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user=Depends(get_current_user)
 ):
-    now = datetime.now()
-    today_start = datetime(now.year, now.month, now.day)
-    week_start = today_start - timedelta(days=7)
-    month_start = today_start - timedelta(days=30)
-
-    # Today
-    result_today = await db.execute(
-        select(UserJobAction)
-        .where(
-            UserJobAction.user_id == current_user.id,
-            UserJobAction.action == JobActionEnum.APPLIED,
-            UserJobAction.timestamp >= today_start
-        )
-    )
-    count_today = len(result_today.scalars().all())
-
-    # Last week (excluding today)
-    result_week = await db.execute(
-        select(UserJobAction)
-        .where(
-            UserJobAction.user_id == current_user.id,
-            UserJobAction.action == JobActionEnum.APPLIED,
-            UserJobAction.timestamp >= week_start,
-            UserJobAction.timestamp < today_start
-        )
-    )
-    count_week = len(result_week.scalars().all())
+    return await count_job_actions(db, current_user.id, JobActionEnum.APPLIED)
 
-    # Last month (excluding this week and today)
-    result_month = await db.execute(
-        select(UserJobAction)
-        .where(
-            UserJobAction.user_id == current_user.id,
-            UserJobAction.action == JobActionEnum.APPLIED,
-            UserJobAction.timestamp >= month_start,
-            UserJobAction.timestamp < week_start
-        )
-    )
-    count_month = len(result_month.scalars().all())
 
-    return {
-        "applied_today": count_today,
-        "applied_last_week": count_week,
-        "applied_last_month": count_month
-    }
\ No newline at end of file
+@router.post("/ingest", response_model=IngestResult)
+async def ingest_job_feed(
+    file: UploadFile = File(..., description="CSV with a header row, or JSON lines"),
+    format: str = Query("jsonl", regex="^(csv|jsonl)$"),
+    db: AsyncSession = Depends(get_session),
+    admin=Depends(get_admin_user)
+):
+    try:
+        return await ingest_jobs(db, open_upload(file.file), format)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read feed: {e}")
@@ -1,10 +1,10 @@
-import boto3
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.core.config import settings
-from app.api.v1.auth import get_current_user
+from app.services.auth import get_current_user
 from app.models.user import User
 from app.models.image import Image
 from app.db.session import get_session
+from app.services.aws import AWSClients, get_aws
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from pydantic import BaseModel
@@ -24,7 +24,8 @@ async def generate_presigned_url(
     filename: str = Query(...),
     content_type: str = Query(...),
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    aws: AWSClients = Depends(get_aws)
 ):
     # 1. Create Image record (empty file_path for now)
     image = Image(file_path="", user_id=current_user.id)
@@ -33,14 +34,8 @@ async def generate_presigned_url(
     await db.refresh(image)
 
     # 2. Generate presigned URL with image.id as metadata
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
-    )
     s3_key = f"{filename}"
-    presigned_post = s3_client.generate_presigned_post(
+    presigned_post = aws.s3.generate_presigned_post(
         Bucket=settings.AWS_S3_BUCKET_NAME,
         Key=s3_key,
         Fields={
@@ -50,7 +45,7 @@ async def generate_presigned_url(
         Conditions=[
             {"Content-Type": content_type},
             {"x-amz-meta-image-id": str(image.id)},
-            ["content-length-range", 0, 10485760]
+            ["content-length-range", 0, settings.UPLOAD_MAX_BYTES]
         ],
         ExpiresIn=3600,
     )
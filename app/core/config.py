@@ -14,16 +14,166 @@ class Settings(BaseSettings):
     DB_PORT: Optional[int] = 5432
     DB_NAME: Optional[str] = None
     DBCONNECTIONSTRING: Optional[str] = None
+    # Engine and pool; SQL echo is for local debugging only, it logs synchronously
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    # Recycle connections before server or proxy idle timeouts close them
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection; 0 for pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Read replicas (comma-separated URLs) for get_read_session; reads fall back to the
+    # primary when none is healthy, and for DB_READ_YOUR_WRITES_WINDOW seconds after a client writes
+    DB_REPLICA_URLS: Optional[str] = None
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0
+    DB_REPLICA_CHECK_TIMEOUT: float = 2.0
+    # Replicas further behind than this many seconds are taken out of rotation
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_READ_YOUR_WRITES_WINDOW: float = 5.0
+    DB_READ_YOUR_WRITES_CLIENTS: int = 10000
+    # Startup schema handling: "check" only verifies schema_version against the code's
+    # migrations, which the deploy applies first (the migration step in buildspec.yml, the
+    # docker-compose migrate service); "migrate" applies pending migrations at startup, for
+    # throwaway databases
+    DB_SCHEMA_MODE: str = "check"
+    # Per-request query counting, N+1 warnings and the slow-query log
+    DB_INSTRUMENTATION: bool = True
+    DB_SLOW_QUERY_MS: float = 200.0
+    # The same statement this many times in one request is reported as a likely N+1
+    DB_N_PLUS_ONE_THRESHOLD: int = 10
+
+    # Request metrics at /metrics (Prometheus text) and Server-Timing response headers
+    METRICS_ENABLED: bool = True
+    # /metrics answers loopback clients only unless this is set (e.g. for a scraper in another container)
+    METRICS_PUBLIC: bool = False
+    SERVER_TIMING: bool = True
 
     SECRET_KEY: Optional[str]
     JWT_ALGORITHM: Optional[str]
     ACCESS_TOKEN_EXPIRE_MINUTES: Optional[int]
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000
+    # Longest a deleted or changed user is still served from the principal
+    # cache by another process, or after a Core update()/delete()
+    AUTH_PRINCIPAL_CACHE_TTL: float = 30.0
+    # Build the current user from signed token claims without touching the DB
+    AUTH_CLAIMS_ONLY: bool = False
+    # Users allowed to call admin endpoints such as job ingestion
+    ADMIN_EMAILS: list[str] = []
+    PASSWORD_HASH_WORKERS: int = 2
+    # Signups/logins allowed in flight before the API answers 503
+    PASSWORD_HASH_MAX_PENDING: int = 64
 
     # S3 Settings
     AWS_ACCESS_KEY_ID: Optional[str]
     AWS_SECRET_ACCESS_KEY: Optional[str]
     AWS_REGION: Optional[str]
     AWS_S3_BUCKET_NAME: Optional[str]
+    # Point at a local stand-in (moto server, minio) instead of AWS
+    AWS_ENDPOINT_URL: Optional[str] = None
+    AWS_MAX_POOL_CONNECTIONS: int = 32
+    AWS_EXECUTOR_WORKERS: int = 32
+    AWS_CONNECT_TIMEOUT: float = 5.0
+    AWS_READ_TIMEOUT: float = 30.0
+    AWS_MAX_ATTEMPTS: int = 3
+    PRESIGNED_URL_EXPIRES_IN: int = 3600
+    PRESIGNED_URL_CACHE_SIZE: int = 50000
+    # Stop handing out a cached URL this many seconds before it expires
+    PRESIGNED_URL_SAFETY_MARGIN: int = 300
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MULTIPART_CONCURRENCY: int = 4
+
+    # Image analysis results in DynamoDB, keyed by "image-id"
+    ANALYSIS_TABLE_NAME: str = "imageanalysis"
+    # Finished analyses are cached until evicted; pending ones are re-checked after the TTL
+    # by the analysis endpoints (the worker's extractor re-checks them on each pass instead)
+    ANALYSIS_CACHE_SIZE: int = 20000
+    ANALYSIS_PENDING_TTL: float = 5.0
+    # BatchGetItem rounds for keys DynamoDB leaves unprocessed (throttling)
+    ANALYSIS_BATCH_MAX_ATTEMPTS: int = 5
+    # Payload keys whose string values (or "Name"s) make up the analysis summary
+    ANALYSIS_EXTRACT_KEYS: tuple[str, ...] = ("Categories", "Name", "Parents")
+    # The analysis worker copies summaries into ImageAnalysis.results as they land in
+    # DynamoDB: one page of 100 images every INTERVAL seconds, oldest first, cycling through
+    # those uploaded within the last WINDOW seconds that have none yet
+    ANALYSIS_EXTRACT_INTERVAL: float = 10.0
+    ANALYSIS_EXTRACT_WINDOW: float = 24 * 3600
+
+    # Worker computing image properties for new uploads. Off in the API: run exactly one
+    # `python -m app.services.analysis_worker` process (the docker-compose worker service).
+    # Enabling it here starts one in every uvicorn process; rows are claimed with FOR UPDATE
+    # SKIP LOCKED on Postgres, so that is safe, but multiplies the process pools.
+    ANALYSIS_WORKER_ENABLED: bool = False
+    ANALYSIS_WORKER_PROCESSES: int = 2
+    # Images being analysed at once per process; nothing more is claimed until a slot frees
+    ANALYSIS_WORKER_CONCURRENCY: int = 4
+    ANALYSIS_WORKER_POLL_INTERVAL: float = 2.0
+    ANALYSIS_WORKER_TIMEOUT: float = 30.0
+    ANALYSIS_WORKER_MAX_ATTEMPTS: int = 3
+    ANALYSIS_WORKER_RETRY_DELAY: float = 10.0
+    # A PROCESSING row not finished within this many seconds is assumed orphaned and reclaimed
+    ANALYSIS_WORKER_LEASE: float = 300.0
+    ANALYSIS_DOMINANT_COLOURS: int = 5
+
+    # Resized JPEG copies stored next to each original: name -> longest side in pixels
+    IMAGE_DERIVATIVE_SIZES: dict[str, int] = {"thumb": 256, "preview": 1024}
+    IMAGE_DERIVATIVE_QUALITY: int = 85
+    IMAGE_DERIVATIVE_WORKERS: int = 2
+    IMAGE_DERIVATIVE_MAX_PENDING: int = 32
+    # S3 originals whose derivatives are known to exist, so requests skip the HEAD. Per process,
+    # so a derivative deleted by another process is only forgotten once the TTL runs out
+    IMAGE_DERIVATIVE_CACHE_SIZE: int = 50000
+    IMAGE_DERIVATIVE_CACHE_TTL: float = 300.0
+    # Derivative URLs are content-addressed, so browsers may keep them for good
+    IMAGE_DERIVATIVE_MAX_AGE: int = 31536000
+
+    # Perceptual hashing at upload, and the per-user near-duplicate index
+    IMAGE_HASH_WORKERS: int = 1
+    IMAGE_HASH_MAX_PENDING: int = 32
+    SIMILARITY_INDEX_USERS: int = 1000
+    # Loaded indexes are rebuilt after this long, picking up uploads handled by other processes
+    SIMILARITY_INDEX_TTL: float = 300.0
+    SIMILARITY_DEFAULT_MAX_DISTANCE: int = 10
+
+    # Uploads
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024
+    # Resumable uploads (/api/image/uploads): every chunk but the last is exactly
+    # CHUNK_SIZE, which must be at least 5 MiB since chunks become S3 multipart parts
+    UPLOAD_SESSION_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_SESSION_MAX_BYTES: int = 200 * 1024 * 1024
+    # Sessions untouched this long are abandoned; finished ones are kept as long
+    # so a retried finalize still gets its image
+    UPLOAD_SESSION_TTL: int = 24 * 3600
+    # A finalize that has not finished after this long (crashed) may be claimed again
+    UPLOAD_SESSION_FINALIZE_LEASE: int = 300
+    # Seconds between garbage collection passes; 0 leaves it to `python -m app.services.uploads`
+    UPLOAD_SESSION_GC_INTERVAL: float = 600.0
+
+    # /api/jobs/all?count=estimate uses the planner estimate above this many rows
+    JOBS_COUNT_ESTIMATE_THRESHOLD: int = 10000
+    # Indexed tsvector search on Postgres; False keeps the ILIKE substring search
+    JOBS_SEARCH_FULLTEXT: bool = True
+
+    # /api/jobs/jobs-count windows: name -> (start, end) in days before today,
+    # start inclusive, end exclusive, None end = up to now
+    JOB_STATS_WINDOWS: dict[str, tuple[int, Optional[int]]] = {
+        "applied_today": (0, None),
+        "applied_last_week": (7, 0),
+        "applied_last_month": (30, 7),
+    }
+    # "actions" aggregates user_job_actions; "daily" reads the per-day counters
+    # (run `python -m app.services.job_stats` once to backfill them)
+    JOB_STATS_SOURCE: str = "actions"
+
+    INGEST_BATCH_SIZE: int = 1000
+
+    # Rendered /api/jobs/all and /user-jobs pages kept in-process, validated by ETag:
+    # up to PAGES_PER_USER pages for each of the USERS most recently active users
+    JOB_RESPONSE_CACHE_USERS: int = 5000
+    JOB_RESPONSE_CACHE_PAGES_PER_USER: int = 16
 
     # Environment mode
     ENV: str = ".env"
@@ -36,8 +186,6 @@ class Settings(BaseSettings):
         # Otherwise, build from parameters
         if not all([self.DB_USER, self.DB_PASSWORD, self.DB_NAME]):
             raise ValueError("Database credentials are not properly set")
-        
-        print(f"CORS origins loaded: {settings.CORS_ORIGINS}")
         return (
             f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}"
             f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
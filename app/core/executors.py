@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class PoolBusy(RuntimeError):
+    """Raised instead of queueing when a pool already has `max_pending` calls; the API answers 503."""
+
+
+class BoundedProcessPool:
+    """
+    Process pool for CPU-bound work that must not run on the event loop.
+    At most `max_pending` calls may be running or queued; beyond that callers
+    get PoolBusy instead of piling up behind the pool. A call counts until the
+    process finishes it, even if its caller stopped waiting: a timeout does not
+    stop the work once the pool has taken it. With max_workers <= 0 the
+    function runs inline, which is only meant for tests and benchmarks.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the parent already runs DB and AWS threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.max_workers <= 0:
+            return fn(*args)
+        if self.pending >= self.max_pending:
+            raise PoolBusy(f"Server is busy ({self.name}), please retry shortly.")
+        loop = asyncio.get_running_loop()
+        future: Future = self._executor().submit(fn, *args)
+        self.pending += 1
+
+        def done(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # The loop has closed (shutdown); nothing is counting any more
+                pass
+
+        future.add_done_callback(done)
+        # Cancelling the wrapper cancels the call if it is still queued
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,178 @@
+"""
+In-process request metrics with no external collector: latency histograms per
+route, an in-flight gauge and time per phase (auth, db, aws, bcrypt), rendered
+in the Prometheus text format for /metrics and summarised per response in a
+Server-Timing header. Everything runs on the event loop, so plain counters
+need no locks; recording is a bisect and a few additions.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+from app.db.instrumentation import current_query_stats
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.requests: dict[tuple[str, str, str], Histogram] = {}
+        self.phases: dict[str, Histogram] = {}
+        self.in_flight = 0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, str(status))
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_phase(self, phase: str, seconds: float) -> None:
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.observe(seconds)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by method, route template and status.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            labels = f'method="{method}",route="{_label(route)}",status="{status}"'
+            lines.extend(histogram.render("http_request_duration_seconds", labels))
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP app_phase_duration_seconds Time spent per phase of request handling.",
+            "# TYPE app_phase_duration_seconds histogram",
+        ]
+        for phase, histogram in sorted(self.phases.items()):
+            lines.extend(histogram.render("app_phase_duration_seconds", f'phase="{_label(phase)}"'))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class RequestTimings:
+    """Phase totals for the current request: name -> [seconds, occurrences]."""
+
+    __slots__ = ("phases",)
+
+    def __init__(self) -> None:
+        self.phases: dict[str, list[float]] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        totals = self.phases.get(phase)
+        if totals is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            totals[0] += seconds
+            totals[1] += 1
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+    metrics.observe_phase(phase, seconds)
+
+
+@contextmanager
+def timed_phase(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+def server_timing(total: float, timings: RequestTimings, db: Optional[Any] = None) -> str:
+    entries = [f"app;dur={total * 1000:.1f}"]
+    if db is not None and db.count:
+        entries.append(f'db;dur={db.duration * 1000:.1f};desc="{db.count} queries"')
+    for phase, (seconds, count) in timings.phases.items():
+        entries.append(f'{phase};dur={seconds * 1000:.1f};desc="{int(count)}x"')
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """
+    Times each HTTP request by route template (not raw path, to keep label
+    cardinality bounded), tracks requests in flight, and adds a Server-Timing
+    header with the request's phase totals.
+    """
+
+    def __init__(self, app: Any, server_timing_header: Optional[bool] = None):
+        self.app = app
+        self.server_timing_header = settings.SERVER_TIMING if server_timing_header is None else server_timing_header
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status = 500
+        metrics.in_flight += 1
+
+        async def send_with_timing(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header:
+                    # Query stats are set by QueryStatsMiddleware when DB instrumentation is on
+                    header = server_timing(time.perf_counter() - started, timings, current_query_stats())
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight -= 1
+            _request_timings.reset(token)
+            db = current_query_stats()
+            if db is not None and db.count:
+                metrics.observe_phase("db", db.duration)
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"], getattr(route, "path_format", None) or "unmatched", status,
+                time.perf_counter() - started,
+            )
@@ -3,6 +3,8 @@ from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from .config import settings
+from .executors import BoundedProcessPool
+from .metrics import timed_phase
 
 SECRET_KEY = settings.SECRET_KEY  # Use a secure value from env in production!
 ALGORITHM = settings.JWT_ALGORITHM
@@ -16,6 +18,21 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# bcrypt blocks for 100ms+ per call, so async callers hash in a separate process pool
+password_pool = BoundedProcessPool(
+    "password hashing",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+async def get_password_hash_async(password: str) -> str:
+    with timed_phase("bcrypt"):
+        return await password_pool.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    with timed_phase("bcrypt"):
+        return await password_pool.run(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -0,0 +1,106 @@
+"""
+Merge duplicate jobs and job actions ahead of migration 0002, which adds
+unique indexes on nhs_jobs.reference_number and user_job_actions
+(user_id, job_id) and refuses to run while duplicates remain:
+
+    python -m app.db.deduplicate_jobs            # report what would change
+    python -m app.db.deduplicate_jobs --apply    # change it, in one transaction
+
+The most recently updated job per reference number is kept and its
+duplicates' actions move onto it; then each user's latest action per job is
+kept. Deleted rows cannot be restored, so review the report (and take a
+backup) before --apply. The daily action counters are rebuilt afterwards so
+they agree with the remaining actions.
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+# The job each action ends up on: the newest job with its job's reference number
+_SURVIVOR = """
+    SELECT keep.id FROM nhs_jobs keep
+    WHERE keep.reference_number = (SELECT j.reference_number FROM nhs_jobs j WHERE j.id = user_job_actions.job_id)
+    ORDER BY keep.updated_at DESC, keep.id
+    LIMIT 1
+"""
+
+_SUPERSEDED_JOB = """
+    EXISTS (
+        SELECT 1 FROM nhs_jobs newer
+        WHERE newer.reference_number = nhs_jobs.reference_number
+          AND (newer.updated_at > nhs_jobs.updated_at OR (newer.updated_at = nhs_jobs.updated_at AND newer.id < nhs_jobs.id))
+    )
+"""
+
+# Evaluated after the actions have moved onto the surviving jobs
+_SUPERSEDED_ACTION = """
+    EXISTS (
+        SELECT 1 FROM user_job_actions other
+        WHERE other.user_id = user_job_actions.user_id AND other.job_id = user_job_actions.job_id
+          AND (other.timestamp > user_job_actions.timestamp
+               OR (other.timestamp = user_job_actions.timestamp AND other.id < user_job_actions.id))
+    )
+"""
+
+_COUNTS = {
+    "reference numbers with duplicate jobs": (
+        "SELECT count(*) FROM (SELECT reference_number FROM nhs_jobs GROUP BY reference_number HAVING count(*) > 1) d"
+    ),
+    "jobs to delete": f"SELECT count(*) FROM nhs_jobs WHERE {_SUPERSEDED_JOB}",
+    "actions to move onto the kept job": f"SELECT count(*) FROM user_job_actions WHERE job_id <> ({_SURVIVOR})",
+}
+
+# Per user and kept job, how many actions it will have; all but one of each are deleted
+_MERGED_ACTIONS = f"""
+    SELECT count(*) FROM (SELECT user_id, ({_SURVIVOR}) AS job_id FROM user_job_actions) moved
+    GROUP BY user_id, job_id HAVING count(*) > 1
+"""
+
+
+def report(conn: Connection) -> dict[str, int]:
+    """What `deduplicate` would change, without changing it."""
+    counts = {name: conn.execute(text(query)).scalar() or 0 for name, query in _COUNTS.items()}
+    counts["actions to delete"] = sum(count - 1 for count in conn.execute(text(_MERGED_ACTIONS)).scalars())
+    return counts
+
+
+def deduplicate(conn: Connection) -> None:
+    conn.execute(text(f"UPDATE user_job_actions SET job_id = ({_SURVIVOR}) WHERE job_id <> ({_SURVIVOR})"))
+    conn.execute(text(f"DELETE FROM nhs_jobs WHERE {_SUPERSEDED_JOB}"))
+    conn.execute(text(f"DELETE FROM user_job_actions WHERE {_SUPERSEDED_ACTION}"))
+
+
+async def _main(apply: bool) -> int:
+    from app.db.session import AsyncSessionLocal, engine
+    from app.services.job_stats import rebuild_daily_stats
+
+    try:
+        async with engine.begin() as conn:
+            counts = await conn.run_sync(report)
+            for name, count in counts.items():
+                print(f"{name}: {count}")
+            if not any(counts.values()):
+                print("no duplicates")
+                return 0
+            if not apply:
+                print("dry run, nothing changed; rerun with --apply to merge them")
+                return 0
+            await conn.run_sync(deduplicate)
+            has_stats = await conn.run_sync(lambda sync: inspect(sync).has_table("user_job_daily_stats"))
+        print("duplicates merged")
+        if has_stats:
+            async with AsyncSessionLocal() as db:
+                await rebuild_daily_stats(db)
+            print("daily action counters rebuilt")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report, and with --apply merge, duplicate jobs and job actions.")
+    parser.add_argument("--apply", action="store_true", help="delete the duplicates instead of only reporting them")
+    sys.exit(asyncio.run(_main(parser.parse_args().apply)))
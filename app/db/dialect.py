@@ -0,0 +1,55 @@
+import json
+from typing import Any, Optional
+
+from sqlalchemy import func, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def insert(db: AsyncSession, table: Any):
+    """INSERT for the session's dialect, so callers can use on_conflict_do_* upserts."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return dialect_insert(table)
+
+
+def json_merge(db: AsyncSession, column: Any, patch: Any):
+    """
+    `column` with the top-level keys of `patch` (a dict or JSON expression)
+    set over it, NULL counting as {}: jsonb || on Postgres, json_patch on SQLite.
+    """
+    if isinstance(patch, dict):
+        patch = literal(patch, type_=column.type)
+    if db.bind.dialect.name == "postgresql":
+        return func.coalesce(column, text("'{}'::jsonb")).op("||")(patch)
+    return func.json_patch(func.coalesce(column, "{}"), patch)
+
+
+def json_has_key(db: AsyncSession, column: Any, key: str):
+    """Whether the JSON object in `column` has top-level `key`, False for NULL: jsonb ? on Postgres, json_type on SQLite."""
+    if db.bind.dialect.name == "postgresql":
+        return func.coalesce(column.op("?")(key), False)
+    return func.json_type(column, f'$."{key}"').is_not(None)
+
+
+async def count_rows(db: AsyncSession, query: Any, estimate_above: Optional[int] = None) -> tuple[int, bool]:
+    """
+    COUNT(*) over `query`. With `estimate_above` on Postgres, the planner's row
+    estimate is returned instead when it exceeds that many rows; the second
+    value says whether the count is an estimate.
+    """
+    if estimate_above is not None and db.bind.dialect.name == "postgresql":
+        compiled = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+        result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimated = int(plan[0]["Plan"]["Plan Rows"])
+        if estimated > estimate_above:
+            return estimated, True
+    result = await db.execute(select(func.count()).select_from(query.order_by(None).subquery()))
+    return result.scalar_one(), False
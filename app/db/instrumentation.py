@@ -0,0 +1,108 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.db.slow_query")
+
+_STARTED = "query_started_at"
+
+
+class QueryStats:
+    """Statements run on behalf of one request, and how long they spent in the database."""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements executed at least `threshold` times, the usual shape of an N+1."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info[_STARTED].pop()
+    duration = time.perf_counter() - started
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if duration * 1000 >= settings.DB_SLOW_QUERY_MS:
+        slow_query_logger.warning("%.1f ms: %s", duration * 1000, " ".join(statement.split())[:2000])
+
+
+def _handle_error(exception_context) -> None:
+    # The failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get(_STARTED) if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement on `engine` (the sync_engine of an AsyncEngine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class QueryStatsMiddleware:
+    """
+    Collects QueryStats for each HTTP request, reports them in X-DB-Query-Count
+    and X-DB-Time-Ms response headers, and logs requests that look like N+1s.
+    Plain ASGI, so the request runs in the context the stats were set in.
+    """
+
+    def __init__(self, app: Any, threshold: Optional[int] = None):
+        self.app = app
+        self.threshold = threshold or settings.DB_N_PLUS_ONE_THRESHOLD
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+
+        async def send_with_stats(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _query_stats.reset(token)
+            for statement, n in stats.repeated(self.threshold):
+                logger.warning(
+                    "Possible N+1 in %s %s: %d executions of %s",
+                    scope["method"], scope["path"], n, " ".join(statement.split())[:500],
+                )
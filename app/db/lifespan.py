@@ -1,12 +1,48 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from app.db.session import init_db
+from app.core.config import settings
+from app.core.security import password_pool
+from app.db.replicas import ReplicaPool
+from app.db.session import AsyncSessionLocal, init_db
+from app.services.analysis import AnalysisStore
+from app.services.analysis_worker import AnalysisWorker
+from app.services.aws import AWSClients
+from app.services.derivatives import DerivativeStore
+from app.services.job_cache import JobResponseCache
+from app.services.presign import PresignedUrlCache
+from app.services.similarity import SimilarityIndex, hash_pool
+from app.services.uploads import UploadCollector
 
 
 @asynccontextmanager
 async def life_span_handeler(app: FastAPI):
     print("Server starting ***************")
     await init_db()
+    app.state.replicas = ReplicaPool()
+    await app.state.replicas.start()
+    app.state.aws = AWSClients()
+    app.state.aws.preload("s3", "dynamodb")
+    app.state.presigned_urls = PresignedUrlCache(app.state.aws)
+    app.state.job_cache = JobResponseCache()
+    app.state.analysis = AnalysisStore(app.state.aws)
+    app.state.derivatives = DerivativeStore(app.state.aws)
+    app.state.similarity = SimilarityIndex(AsyncSessionLocal)
+    app.state.analysis_worker = None
+    if settings.ANALYSIS_WORKER_ENABLED:
+        app.state.analysis_worker = AnalysisWorker(
+            AsyncSessionLocal, app.state.aws, derivatives=app.state.derivatives, analysis=app.state.analysis
+        )
+        app.state.analysis_worker.start()
+    app.state.upload_collector = UploadCollector(AsyncSessionLocal, app.state.aws)
+    app.state.upload_collector.start()
     yield
+    await app.state.upload_collector.stop()
+    if app.state.analysis_worker is not None:
+        await app.state.analysis_worker.stop()
+    app.state.derivatives.shutdown()
+    await app.state.replicas.stop()
+    app.state.aws.close()
+    password_pool.shutdown()
+    hash_pool.shutdown()
     print("server stopped *****************")
@@ -0,0 +1,166 @@
+"""
+Versioned schema migrations, applied out of band before new code is rolled out:
+
+    python -m app.db.migrate             # apply pending migrations
+    python -m app.db.migrate --check     # exit 1 unless the schema is up to date
+    python -m app.db.migrate --status
+
+Migrations are the vNNNN_*.py modules in app.db.migrations, each with an
+`upgrade(conn)` taking a synchronous Connection. They describe the schema as
+it was at that version rather than importing the models, so later model
+changes never rewrite history. Applied versions are recorded one row each in
+schema_version, and app startup only reads that table (DB_SCHEMA_MODE).
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import pkgutil
+import re
+import sys
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db import migrations
+from app.db.migrations import MigrationBlocked
+
+logger = logging.getLogger(__name__)
+
+# Serialises concurrent runners on Postgres (any constant shared by all of them)
+_ADVISORY_LOCK_KEY = 7_240_311
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+@lru_cache
+def discover() -> tuple[Migration, ...]:
+    found = []
+    for module in pkgutil.iter_modules(migrations.__path__):
+        match = re.fullmatch(r"v(\d{4})_(\w+)", module.name)
+        if match:
+            loaded = importlib.import_module(f"{migrations.__name__}.{module.name}")
+            found.append(Migration(int(match.group(1)), match.group(2), loaded.upgrade))
+    found.sort()
+    versions = [m.version for m in found]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions in {migrations.__name__}: {versions}")
+    return tuple(found)
+
+
+def latest_version() -> int:
+    known = discover()
+    return known[-1].version if known else 0
+
+
+def _current(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+async def current_version(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        return await conn.run_sync(_current)
+
+
+def _apply(conn: Connection, migration: Migration) -> bool:
+    if conn.dialect.name == "postgresql":
+        # Held until the transaction ends; a runner that waited here sees the version already applied
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+    schema_version.create(conn, checkfirst=True)
+    if _current(conn) >= migration.version:
+        return False
+    migration.upgrade(conn)
+    conn.execute(schema_version.insert().values(
+        version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+    ))
+    return True
+
+
+async def upgrade(engine: AsyncEngine, target: Optional[int] = None) -> list[Migration]:
+    """Apply pending migrations up to `target` (default: all), each in its own transaction."""
+    applied = []
+    current = await current_version(engine)
+    for migration in discover():
+        if migration.version <= current or (target is not None and migration.version > target):
+            continue
+        async with engine.begin() as conn:
+            if await conn.run_sync(_apply, migration):
+                logger.info("Applied migration %04d_%s", migration.version, migration.name)
+                applied.append(migration)
+    return applied
+
+
+async def check(engine: AsyncEngine) -> int:
+    """The database's schema version; raises SchemaOutOfDate if migrations are pending."""
+    current = await current_version(engine)
+    latest = latest_version()
+    if current < latest:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {current}, this code needs {latest}. "
+            "Run `python -m app.db.migrate` first."
+        )
+    if current > latest:
+        # Migrations are additive, so code one release behind the schema still runs (rolling deploys)
+        logger.warning("Database schema version %d is newer than this code's %d", current, latest)
+    return current
+
+
+async def _main(args: argparse.Namespace) -> int:
+    from app.db.session import engine
+
+    try:
+        if args.status:
+            current = await current_version(engine)
+            for migration in discover():
+                state = "applied" if migration.version <= current else "pending"
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+            return 0
+        if args.check:
+            try:
+                print(f"schema version {await check(engine)} is up to date")
+            except SchemaOutOfDate as e:
+                print(e, file=sys.stderr)
+                return 1
+            return 0
+        try:
+            applied = await upgrade(engine, args.target)
+        except MigrationBlocked as e:
+            print(e, file=sys.stderr)
+            return 1
+        for migration in applied:
+            print(f"applied {migration.version:04d} {migration.name}")
+        print(f"schema version {await current_version(engine)}")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply or check versioned schema migrations.")
+    parser.add_argument("--check", action="store_true", help="exit 1 if migrations are pending")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
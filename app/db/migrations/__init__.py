@@ -0,0 +1,37 @@
+"""
+Schema migrations, applied in version order by app.db.migrate. The helpers
+here skip work that is already done, so a migration also brings a database
+created by the old `create_all` startup up to the same schema.
+"""
+from sqlalchemy import Index, Table, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint, Column, CreateColumn, ForeignKeyConstraint
+
+
+class MigrationBlocked(RuntimeError):
+    """The data needs an operator's decision before this migration can run; nothing was changed."""
+
+
+def create_table(conn: Connection, table: Table) -> None:
+    """CREATE TABLE with its inline indexes, unless the table exists."""
+    table.create(conn, checkfirst=True)
+
+
+def create_index(conn: Connection, index: Index) -> None:
+    index.create(conn, checkfirst=True)
+
+
+def add_column(conn: Connection, column: Column) -> bool:
+    """ALTER TABLE ... ADD COLUMN for a column of a migration's Table, unless it exists. True if added."""
+    table = column.table
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return False
+    spec = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} ADD COLUMN {spec}"))
+    return True
+
+
+def add_foreign_key(conn: Connection, constraint: ForeignKeyConstraint) -> None:
+    # SQLite cannot add constraints to an existing table; its foreign keys are not enforced by default anyway
+    if conn.dialect.name != "sqlite":
+        conn.execute(AddConstraint(constraint))
@@ -0,0 +1,64 @@
+"""The schema as `create_all` built it before migrations: users, images and their analyses, jobs and job actions."""
+from sqlalchemy import JSON, Boolean, Column, Date, DateTime, Enum, ForeignKey, MetaData, String, Table, Uuid
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection
+
+from app.db.migrations import create_table
+
+metadata = MetaData()
+
+
+def _base_columns() -> list[Column]:
+    return [
+        Column("id", Uuid, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    ]
+
+
+user = Table(
+    "user", metadata, *_base_columns(),
+    Column("username", String, nullable=False, index=True),
+    Column("email", String, nullable=False, unique=True, index=True),
+    Column("hashed_password", String, nullable=False),
+)
+
+image = Table(
+    "image", metadata, *_base_columns(),
+    Column("file_path", String, nullable=False),
+    Column("user_id", Uuid, ForeignKey("user.id"), nullable=False),
+)
+
+imageanalysis = Table(
+    "imageanalysis", metadata, *_base_columns(),
+    Column("image_id", Uuid, ForeignKey("image.id"), nullable=False, unique=True),
+    Column("s3_key", String, nullable=False),
+    Column("status", Enum("UPLOADED", "PROCESSING", "DONE", "FAILED", name="jobanalysisstatus"), nullable=False),
+    Column("results", JSON().with_variant(JSONB(), "postgresql")),
+)
+
+nhs_jobs = Table(
+    "nhs_jobs", metadata, *_base_columns(),
+    Column("title", String, nullable=False),
+    Column("date_posted", Date, nullable=False),
+    Column("salary", String, nullable=False),
+    Column("contract", String, nullable=False),
+    Column("reference_number", String, nullable=False),
+    Column("address", String, nullable=False),
+    Column("closing_date", Date, nullable=False),
+    Column("sponsored", Boolean, nullable=False),
+    Column("link", String, nullable=False),
+)
+
+user_job_actions = Table(
+    "user_job_actions", metadata, *_base_columns(),
+    Column("user_id", Uuid, ForeignKey("user.id"), nullable=False),
+    Column("job_id", Uuid, ForeignKey("nhs_jobs.id"), nullable=False),
+    Column("action", Enum("APPLIED", "IGNORED", name="jobactionenum"), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    for table in metadata.sorted_tables:
+        create_table(conn, table)
@@ -0,0 +1,167 @@
+"""
+Schema changes made while the app still used `create_all`, which creates
+missing tables but never alters existing ones: content-addressed blobs and
+perceptual hashes, analysis worker bookkeeping, per-day action counters, and
+the job listing indexes and uniqueness.
+"""
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import (
+    BigInteger, Column, Date, DateTime, Enum, ForeignKey, ForeignKeyConstraint, Index, Integer, MetaData,
+    String, Table, UniqueConstraint, Uuid, func, inspect, select, text,
+)
+from sqlalchemy.engine import Connection
+
+from app.db.migrations import MigrationBlocked, add_column, add_foreign_key, create_index, create_table
+
+metadata = MetaData()
+
+
+def _base_columns() -> list[Column]:
+    return [
+        Column("id", Uuid, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    ]
+
+
+Table("user", metadata, Column("id", Uuid, primary_key=True))
+
+blob = Table(
+    "blob", metadata, *_base_columns(),
+    Column("content_hash", String, nullable=False, unique=True, index=True),
+    Column("size", Integer, nullable=False),
+    Column("content_type", String),
+    Column("storage_path", String, nullable=False),
+    Column("ref_count", Integer, nullable=False),
+    Column("phash", BigInteger),
+)
+
+user_job_daily_stats = Table(
+    "user_job_daily_stats", metadata, *_base_columns(),
+    Column("user_id", Uuid, ForeignKey("user.id"), nullable=False),
+    Column("day", Date, nullable=False),
+    Column("action", Enum("APPLIED", "IGNORED", name="jobactionenum"), nullable=False),
+    Column("count", Integer, nullable=False),
+    UniqueConstraint("user_id", "day", "action", name="uq_user_job_daily_stats_user_day_action"),
+)
+
+# Only the columns this migration adds or indexes
+image = Table(
+    "image", metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("blob_id", Uuid),
+    Column("phash", BigInteger),
+    ForeignKeyConstraint(["blob_id"], ["blob.id"], name="image_blob_id_fkey"),
+)
+
+imageanalysis = Table(
+    "imageanalysis", metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("status", String),
+    Column("created_at", DateTime),
+    Column("attempts", Integer, nullable=False, server_default=text("0")),
+    Column("claimed_at", DateTime),
+    Column("next_attempt_at", DateTime),
+    Column("error", String),
+)
+
+nhs_jobs = Table(
+    "nhs_jobs", metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("title", String),
+    Column("address", String),
+    Column("reference_number", String),
+    Column("closing_date", Date),
+    Column("updated_at", DateTime),
+)
+
+user_job_actions = Table(
+    "user_job_actions", metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("user_id", Uuid),
+    Column("job_id", Uuid),
+    Column("action", String),
+    Column("timestamp", DateTime),
+)
+
+_search_config = text("'simple'")
+_job_search_vector = func.setweight(func.to_tsvector(_search_config, nhs_jobs.c.title), text("'A'")).op("||")(
+    func.setweight(func.to_tsvector(_search_config, nhs_jobs.c.address), text("'B'"))
+)
+
+INDEXES = [
+    Index("ix_image_blob_id", image.c.blob_id),
+    Index("ix_imageanalysis_status_created_at", imageanalysis.c.status, imageanalysis.c.created_at),
+    Index("ix_nhs_jobs_reference_number", nhs_jobs.c.reference_number, unique=True),
+    Index("ix_nhs_jobs_closing_date", nhs_jobs.c.closing_date),
+    Index("ix_nhs_jobs_updated_at", nhs_jobs.c.updated_at),
+    # A unique index rather than a constraint so it can be added to an existing SQLite table;
+    # ON CONFLICT (user_id, job_id) accepts either
+    Index("uq_user_job_actions_user_job", user_job_actions.c.user_id, user_job_actions.c.job_id, unique=True),
+    Index(
+        "ix_user_job_actions_user_action_timestamp",
+        user_job_actions.c.user_id, user_job_actions.c.action, user_job_actions.c.timestamp,
+    ),
+]
+
+# Rows the unique indexes would reject. Merging them deletes jobs and users'
+# actions, so that is left to app.db.deduplicate_jobs rather than done here
+_DUPLICATES = {
+    "nhs_jobs.reference_number": (
+        "SELECT count(*) FROM (SELECT reference_number FROM nhs_jobs GROUP BY reference_number HAVING count(*) > 1) d"
+    ),
+    "user_job_actions (user_id, job_id)": (
+        "SELECT count(*) FROM (SELECT user_id, job_id FROM user_job_actions GROUP BY user_id, job_id HAVING count(*) > 1) d"
+    ),
+}
+
+
+def _check_duplicates(conn: Connection) -> None:
+    found = {name: conn.execute(text(query)).scalar() for name, query in _DUPLICATES.items()}
+    found = {name: count for name, count in found.items() if count}
+    if found:
+        summary = ", ".join(f"{count} duplicated {name} values" for name, count in found.items())
+        raise MigrationBlocked(
+            f"Cannot add the job unique indexes: {summary}. "
+            "Review them with `python -m app.db.deduplicate_jobs`, merge them with --apply, then migrate again."
+        )
+
+
+def _backfill_daily_stats(conn: Connection) -> None:
+    """Count the existing actions into the new per-day counters."""
+    day = func.date(user_job_actions.c.timestamp)
+    grouped = conn.execute(
+        select(user_job_actions.c.user_id, day, user_job_actions.c.action, func.count())
+        .group_by(user_job_actions.c.user_id, day, user_job_actions.c.action)
+    ).all()
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(), "created_at": now, "updated_at": now, "user_id": user_id,
+            "day": day if isinstance(day, date) else date.fromisoformat(day), "action": action, "count": count,
+        }
+        for user_id, day, action, count in grouped
+    ]
+    if rows:
+        conn.execute(user_job_daily_stats.insert(), rows)
+
+
+def upgrade(conn: Connection) -> None:
+    _check_duplicates(conn)
+    create_table(conn, blob)
+    if not inspect(conn).has_table(user_job_daily_stats.name):
+        create_table(conn, user_job_daily_stats)
+        _backfill_daily_stats(conn)
+
+    if add_column(conn, image.c.blob_id):
+        add_foreign_key(conn, next(iter(image.foreign_key_constraints)))
+    add_column(conn, image.c.phash)
+    for column in ("attempts", "claimed_at", "next_attempt_at", "error"):
+        add_column(conn, imageanalysis.c[column])
+
+    for index in INDEXES:
+        create_index(conn, index)
+    if conn.dialect.name == "postgresql":
+        create_index(conn, Index("ix_nhs_jobs_search", _job_search_vector, postgresql_using="gin"))
@@ -0,0 +1,55 @@
+"""Resumable upload sessions and their received chunks."""
+from sqlalchemy import (
+    Column, DateTime, Enum, ForeignKey, Index, Integer, MetaData, String, Table, UniqueConstraint, Uuid,
+)
+from sqlalchemy.engine import Connection
+
+from app.db.migrations import create_index, create_table
+
+metadata = MetaData()
+
+
+def _base_columns() -> list[Column]:
+    return [
+        Column("id", Uuid, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    ]
+
+
+Table("user", metadata, Column("id", Uuid, primary_key=True))
+
+upload_session = Table(
+    "upload_session", metadata, *_base_columns(),
+    Column("user_id", Uuid, ForeignKey("user.id"), nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("chunk_size", Integer, nullable=False),
+    Column("content_type", String),
+    Column("status", Enum("OPEN", "FINALIZING", "COMPLETE", name="uploadstatus"), nullable=False),
+    Column("staging_path", String, nullable=False),
+    Column("s3_upload_id", String),
+    Column("finalize_token", Uuid),
+    Column("image_id", Uuid),
+    Column("expires_at", DateTime, nullable=False),
+)
+
+upload_part = Table(
+    "upload_part", metadata, *_base_columns(),
+    Column("upload_id", Uuid, ForeignKey("upload_session.id"), nullable=False),
+    Column("number", Integer, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("etag", String),
+    UniqueConstraint("upload_id", "number", name="uq_upload_part_upload_number"),
+)
+
+INDEXES = [
+    Index("ix_upload_session_user_id", upload_session.c.user_id),
+    Index("ix_upload_session_expires_at", upload_session.c.expires_at),
+]
+
+
+def upgrade(conn: Connection) -> None:
+    create_table(conn, upload_session)
+    create_table(conn, upload_part)
+    for index in INDEXES:
+        create_index(conn, index)
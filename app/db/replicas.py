@@ -0,0 +1,187 @@
+"""
+Read/write splitting. Sessions from get_read_session go to a healthy read
+replica, chosen round-robin, and to the primary when no replica is healthy
+or when the client wrote within the last DB_READ_YOUR_WRITES_WINDOW seconds.
+Writes are noticed when a get_session session commits (see get_session);
+the client is then remembered in-process, keyed by its Authorization header,
+and the response carries an X-DB-Read-Primary-Until header (a Unix time).
+Clients echo it back on their next requests so instances that did not see
+the write also send their reads to the primary. A header rather than a
+cookie, as the API is called cross-origin with bearer tokens.
+"""
+import asyncio
+import logging
+import time
+from itertools import count
+from typing import Any, AsyncGenerator, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.instrumentation import instrument_engine
+from app.db.session import engine, engine_options
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_HEADER = "X-DB-Read-Primary-Until"
+
+# Seconds the replica is behind; 0 when it has replayed everything it received,
+# since the replay timestamp stops moving while the primary is idle
+_POSTGRES_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def _name(replica: AsyncEngine) -> str:
+    return replica.url.host or replica.url.database or str(replica.url)
+
+
+class RoutingSession(Session):
+    """Binds the whole session to whichever engine `info["route"]` picks on first use."""
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kw: Any) -> Any:
+        bind = self.info.get("bind")
+        if bind is None:
+            route = self.info.get("route")
+            if route is None:
+                return super().get_bind(mapper, clause, **kw)
+            bind = self.info["bind"] = route()
+        return bind
+
+
+ReadSessionLocal = async_sessionmaker(bind=engine, sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+class ReplicaPool:
+    def __init__(
+        self,
+        urls: Optional[list[str]] = None,
+        check_interval: Optional[float] = None,
+        check_timeout: Optional[float] = None,
+        max_lag: Optional[float] = None,
+        sticky_window: Optional[float] = None,
+    ):
+        if urls is None:
+            urls = [url.strip() for url in (settings.DB_REPLICA_URLS or "").split(",") if url.strip()]
+        self.engines: list[AsyncEngine] = [create_async_engine(url, **engine_options(url)) for url in urls]
+        if settings.DB_INSTRUMENTATION:
+            for replica in self.engines:
+                instrument_engine(replica.sync_engine)
+        self.healthy = [True] * len(self.engines)
+        self.check_interval = settings.DB_REPLICA_CHECK_INTERVAL if check_interval is None else check_interval
+        self.check_timeout = settings.DB_REPLICA_CHECK_TIMEOUT if check_timeout is None else check_timeout
+        self.max_lag = settings.DB_REPLICA_MAX_LAG if max_lag is None else max_lag
+        self.sticky_window = settings.DB_READ_YOUR_WRITES_WINDOW if sticky_window is None else sticky_window
+        self._writers: TTLCache[str, bool] = TTLCache(
+            maxsize=settings.DB_READ_YOUR_WRITES_CLIENTS, ttl=self.sticky_window
+        )
+        self._turn = count()
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[Engine]:
+        """The next healthy replica, round-robin, or None if there is none."""
+        n = len(self.engines)
+        if n == 0:
+            return None
+        start = next(self._turn)
+        for i in range(n):
+            index = (start + i) % n
+            if self.healthy[index]:
+                return self.engines[index].sync_engine
+        return None
+
+    def route(self, request: Request) -> Engine:
+        if self.engines and not self.wrote_recently(request):
+            replica = self.choose()
+            if replica is not None:
+                return replica
+        return engine.sync_engine
+
+    def wrote_recently(self, request: Request) -> bool:
+        authorization = request.headers.get("authorization")
+        if authorization and authorization in self._writers:
+            return True
+        try:
+            until = float(request.headers.get(READ_PRIMARY_HEADER, 0))
+        except ValueError:
+            return False
+        # Issued values are one window ahead (plus clock skew between instances); anything
+        # further out is ignored rather than pinning the client to the primary
+        now = time.time()
+        return now < until <= now + 2 * self.sticky_window
+
+    def record_write(self, request: Request, response: Optional[Response]) -> None:
+        if not self.engines:
+            return
+        authorization = request.headers.get("authorization")
+        if authorization:
+            self._writers.set(authorization, True)
+        if response is not None:
+            response.headers[READ_PRIMARY_HEADER] = f"{time.time() + self.sticky_window:.3f}"
+
+    def mark_down(self, bind: Any) -> None:
+        for index, replica in enumerate(self.engines):
+            if replica.sync_engine is bind and self.healthy[index]:
+                self.healthy[index] = False
+                logger.warning("Read replica %s failed a query, routing reads elsewhere", _name(replica))
+
+    async def _probe(self, replica: AsyncEngine) -> bool:
+        async with replica.connect() as conn:
+            if replica.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return True
+            lag = float((await conn.execute(_POSTGRES_LAG)).scalar() or 0)
+        if lag > self.max_lag:
+            logger.warning("Read replica %s is %.1fs behind, routing reads elsewhere", _name(replica), lag)
+            return False
+        return True
+
+    async def check(self) -> None:
+        async def probe(replica: AsyncEngine) -> bool:
+            try:
+                return await asyncio.wait_for(self._probe(replica), self.check_timeout)
+            except Exception as e:
+                logger.warning("Read replica %s failed its health check: %s", _name(replica), e)
+                return False
+
+        self.healthy = list(await asyncio.gather(*(probe(replica) for replica in self.engines)))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        if self.engines:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.engines:
+            await replica.dispose()
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    replicas: ReplicaPool = request.app.state.replicas
+    async with ReadSessionLocal() as session:
+        session.sync_session.info["route"] = lambda: replicas.route(request)
+        try:
+            yield session
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                replicas.mark_down(session.sync_session.info.get("bind"))
+            raise
@@ -1,21 +1,66 @@
-from typing import AsyncGenerator
+from functools import partial
+from typing import Any, AsyncGenerator
 
-from sqlmodel import SQLModel
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
 
-from app.core.config import settings
+from app.core.config import Settings, settings
+from app.db.instrumentation import instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+
+def engine_options(url: str, config: Settings = settings) -> dict[str, Any]:
+    """create_async_engine keyword arguments for `url`, from Settings."""
+    options: dict[str, Any] = {
+        "echo": config.DB_ECHO,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+    }
+    parsed = make_url(url)
+    # In-memory SQLite runs on a single shared connection, without a sized pool
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+if settings.DB_INSTRUMENTATION:
+    instrument_engine(engine.sync_engine)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     expire_on_commit=False
 )
 
-async def get_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_session(request: Request, response: Response) -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
+        replicas = getattr(request.app.state, "replicas", None)
+        if replicas is not None and replicas.engines:
+            # A commit sends this client's reads to the primary for a while (read-your-writes)
+            session.sync_session.info["on_write"] = partial(replicas.record_write, request, response)
         yield session
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    on_write = session.info.get("on_write")
+    if on_write is not None:
+        on_write()
         
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
\ No newline at end of file
+    """Check (or, with DB_SCHEMA_MODE=migrate, bring up) the schema version at startup."""
+    from app.db.migrate import check, upgrade
+
+    if settings.DB_SCHEMA_MODE == "migrate":
+        await upgrade(engine)
+    elif settings.DB_SCHEMA_MODE != "check":
+        raise ValueError(f"Unknown DB_SCHEMA_MODE {settings.DB_SCHEMA_MODE!r}")
+    await check(engine)
\ No newline at end of file
@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 # from fastapi.staticfiles import StaticFiles
 from scalar_fastapi import get_scalar_api_reference
 from app.core.config import settings
+from app.core.executors import PoolBusy
 
 from app.db.lifespan import life_span_handeler
+from app.db.replicas import READ_PRIMARY_HEADER
+from app.db.instrumentation import QueryStatsMiddleware
+from app.core.metrics import MetricsMiddleware, metrics
 
 from app.api.v1 import auth
 from app.api.v1 import image
@@ -18,6 +23,12 @@ app.include_router(s3_router, prefix="/api/s3", tags=["s3"])
 app.include_router(jobs_router, prefix="/api/jobs", tags=["jobs"])
 
 
+@app.exception_handler(PoolBusy)
+async def pool_busy(request: Request, exc: PoolBusy):
+    # A saturated process pool (password hashing, image work) sheds load instead of queueing
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
 
 # Allow requests from settings.CORS_ORIGINS, fallback to localhost:3000 and 127.0.0.1:3000
 if settings.CORS_ORIGINS:
@@ -34,7 +45,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],    # Allow all HTTP methods
     allow_headers=["*"],    # Allow all headers
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms", "Server-Timing", READ_PRIMARY_HEADER],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Added last so it runs outermost and its query stats cover the metrics middleware too
+if settings.DB_INSTRUMENTATION:
+    app.add_middleware(QueryStatsMiddleware)
 
 # app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -45,6 +62,14 @@ async def home():
         "Age": 34
     }
     
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    client = request.client.host if request.client else None
+    if not settings.METRICS_ENABLED or (not settings.METRICS_PUBLIC and client not in ("127.0.0.1", "::1", "localhost")):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/scalar", include_in_schema=False)
 async def scalar_html():
     return get_scalar_api_reference(
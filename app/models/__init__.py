@@ -1,4 +1,6 @@
 from .base import *
 from .user import *
+from .blob import *
 from .image import *
-from .jobs import *
\ No newline at end of file
+from .jobs import *
+from .upload import *
\ No newline at end of file
@@ -0,0 +1,15 @@
+from typing import Optional
+from sqlalchemy import BigInteger, Column
+from sqlmodel import Field
+from .base import BaseModel
+
+
+class Blob(BaseModel, table=True):
+    """Stored image bytes, keyed by content hash and shared by every Image with the same content."""
+    content_hash: str = Field(index=True, unique=True, nullable=False)
+    size: int = Field(nullable=False)
+    content_type: Optional[str] = None
+    storage_path: str = Field(nullable=False)
+    ref_count: int = Field(default=1, nullable=False)
+    # dHash of the content, computed once per blob and copied onto each Image
+    phash: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
\ No newline at end of file
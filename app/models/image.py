@@ -5,7 +5,7 @@ from sqlmodel import Field, Relationship
 from .base import BaseModel
 from typing import TYPE_CHECKING, Optional
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import Column
+from sqlalchemy import BigInteger, Column, Index, JSON
 
 if TYPE_CHECKING:
     from .user import User
@@ -19,6 +19,9 @@ class JobAnalysisStatus(str, Enum):
 class Image(BaseModel, table=True):
     file_path: str = Field(nullable=False)
     user_id: UUID = Field(foreign_key="user.id", nullable=False)
+    blob_id: Optional[UUID] = Field(default=None, foreign_key="blob.id", index=True)
+    # 64-bit dHash as a signed BIGINT; None when the upload could not be decoded
+    phash: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
     user: "User" = Relationship(back_populates="images")
     analysis: "ImageAnalysis" = Relationship(back_populates="image")
 
@@ -30,14 +33,25 @@ class ImageRead(BaseModel):
     file_path: str
     user_id: UUID
     presigned_url: Optional[str] = None
+    # Derivative name (e.g. "thumb") -> URL, for images stored as blobs
+    derivatives: dict[str, str] = {}
 
 
 class ImageAnalysis(BaseModel, table=True):
+    __table_args__ = (
+        # The analysis worker claims the oldest claimable rows per status
+        Index("ix_imageanalysis_status_created_at", "status", "created_at"),
+    )
     image_id: UUID = Field(foreign_key="image.id", unique=True, nullable=False)
     image: "Image" = Relationship(back_populates="analysis")
     s3_key: str = Field(nullable=False)
     status: JobAnalysisStatus = Field(default=JobAnalysisStatus.UPLOADED)
     results: Optional[dict] = Field(
         default=None,
-        sa_column=Column(JSONB)
+        sa_column=Column(JSON().with_variant(JSONB(), "postgresql"))
     )
+    # Worker bookkeeping: claims, retries and the last failure
+    attempts: int = Field(default=0, nullable=False)
+    claimed_at: Optional[datetime] = None
+    next_attempt_at: Optional[datetime] = None
+    error: Optional[str] = None
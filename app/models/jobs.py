@@ -1,6 +1,7 @@
 import uuid
 from datetime import date, datetime
 from enum import Enum
+from sqlalchemy import Index, UniqueConstraint, func, text
 from sqlmodel import Field, Relationship
 from .base import BaseModel
 from typing import TYPE_CHECKING
@@ -18,11 +19,15 @@ class NHSJob(BaseModel, table=True):
     date_posted: date
     salary: str
     contract: str
-    reference_number: str
+    reference_number: str = Field(unique=True, index=True)
     address: str
-    closing_date: date
+    closing_date: date = Field(index=True)
     sponsored: bool
     link: str
+    # Bumped by ORM and Core updates alike, as the listing ETags depend on it
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow}
+    )
 
     user_actions: list["UserJobAction"] = Relationship(back_populates="job")
 
@@ -31,8 +36,30 @@ class NHSJob(BaseModel, table=True):
     }
 
 
+# Weighted title/address document for full-text job search. The text search
+# config and weights are SQL literals so queries match the GIN index expression.
+_search_config = text("'simple'")
+job_search_vector = func.setweight(
+    func.to_tsvector(_search_config, NHSJob.__table__.c.title), text("'A'")
+).op("||")(
+    func.setweight(func.to_tsvector(_search_config, NHSJob.__table__.c.address), text("'B'"))
+)
+Index("ix_nhs_jobs_search", job_search_vector, postgresql_using="gin").ddl_if(dialect="postgresql")
+# max(updated_at) is the jobs half of the listing ETags
+Index("ix_nhs_jobs_updated_at", NHSJob.__table__.c.updated_at)
+
+
+def job_search_query(tokens: list[str]):
+    """Prefix tsquery (typeahead) requiring every token, e.g. ['staff', 'nur'] -> 'staff:* & nur:*'."""
+    return func.to_tsquery(_search_config, " & ".join(f"{token}:*" for token in tokens))
+
+
 class UserJobAction(BaseModel, table=True):
     __tablename__ = 'user_job_actions'
+    __table_args__ = (
+        UniqueConstraint("user_id", "job_id", name="uq_user_job_actions_user_job"),
+        Index("ix_user_job_actions_user_action_timestamp", "user_id", "action", "timestamp"),
+    )
     user_id: uuid.UUID = Field(foreign_key="user.id")
     job_id: uuid.UUID = Field(foreign_key="nhs_jobs.id")
     action: JobActionEnum
@@ -45,5 +72,16 @@ class UserJobAction(BaseModel, table=True):
         "arbitrary_types_allowed": True
     }
 
+class UserJobDailyStat(BaseModel, table=True):
+    """Per-user, per-day action counts, kept in step with user_job_actions on every insert."""
+    __tablename__ = 'user_job_daily_stats'
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "action", name="uq_user_job_daily_stats_user_day_action"),
+    )
+    user_id: uuid.UUID = Field(foreign_key="user.id")
+    day: date
+    action: JobActionEnum
+    count: int = Field(default=0, nullable=False)
+
 # If not already present, add this to your User model:
 # job_actions: list["UserJobAction"] = Relationship(back_populates="user")
\ No newline at end of file
@@ -0,0 +1,68 @@
+from enum import Enum
+from uuid import UUID
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, Index, String, UniqueConstraint
+from sqlmodel import Field
+from .base import BaseModel
+
+
+class UploadStatus(str, Enum):
+    OPEN = "open"
+    FINALIZING = "finalizing"
+    COMPLETE = "complete"
+
+
+class UploadSession(BaseModel, table=True):
+    """
+    A resumable upload in progress. The client sends `size` bytes as
+    `chunk_size` pieces at chunk-aligned offsets, in any order; finalizing
+    turns them into a Blob and an Image.
+    """
+    __tablename__ = "upload_session"
+    __table_args__ = (
+        # The garbage collector scans for sessions past expires_at
+        Index("ix_upload_session_expires_at", "expires_at"),
+    )
+    user_id: UUID = Field(foreign_key="user.id", nullable=False, index=True)
+    size: int = Field(nullable=False)
+    chunk_size: int = Field(nullable=False)
+    content_type: Optional[str] = None
+    status: UploadStatus = Field(default=UploadStatus.OPEN, nullable=False)
+    # Local directory of part files, or s3://bucket/key of the in-progress multipart upload
+    staging_path: str = Field(nullable=False)
+    s3_upload_id: Optional[str] = Field(default=None, sa_column=Column(String, nullable=True))
+    # Set when finalizing is claimed; only the holder may complete the session
+    finalize_token: Optional[UUID] = None
+    # The finished image; not a foreign key, so deleting the image is not blocked by a lingering session
+    image_id: Optional[UUID] = None
+    expires_at: datetime = Field(nullable=False)
+
+
+class UploadPart(BaseModel, table=True):
+    """One received chunk; `number` is offset // chunk_size + 1, which is also its S3 part number."""
+    __tablename__ = "upload_part"
+    __table_args__ = (
+        UniqueConstraint("upload_id", "number", name="uq_upload_part_upload_number"),
+    )
+    upload_id: UUID = Field(foreign_key="upload_session.id", nullable=False)
+    number: int = Field(nullable=False)
+    size: int = Field(nullable=False)
+    etag: Optional[str] = None
+
+
+# Pydantic-only model for API responses
+class UploadSessionRead(BaseModel):
+    id: UUID
+    created_at: datetime
+    updated_at: datetime
+    size: int
+    chunk_size: int
+    content_type: Optional[str] = None
+    status: UploadStatus
+    # Bytes received without a gap from the start; resume from here
+    offset: int
+    # Every received chunk number, so parallel uploaders can fill gaps past the offset
+    received: list[int] = []
+    image_id: Optional[UUID] = None
+    expires_at: datetime
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Iterable, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.dialect import json_merge
+from app.models import Image, ImageAnalysis
+from app.services.aws import AWSClients
+
+logger = logging.getLogger(__name__)
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_LIMIT = 100
+
+_PENDING = object()
+_deserializer = None
+
+
+def _deserialize(value: dict) -> Any:
+    global _deserializer
+    if _deserializer is None:
+        # Importing boto3 costs a noticeable share of startup, so wait for the first item
+        from boto3.dynamodb.types import TypeDeserializer
+
+        _deserializer = TypeDeserializer()
+    return _deserializer.deserialize(value)
+
+
+def extract_strings(data: Any, keys: Optional[Iterable[str]] = None) -> dict[str, set[str]]:
+    """
+    All string values found under the given keys anywhere in a nested dict/list
+    payload, as key -> set of strings. A matching value that is a string is
+    taken as is; a dict, or the dicts and strings in a list, contribute their
+    "Name". One iterative walk fills a single accumulator, so large payloads
+    are neither copied per level nor limited by recursion depth.
+    """
+    found: dict[str, set[str]] = {key: set() for key in (keys or settings.ANALYSIS_EXTRACT_KEYS)}
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for k, v in node.items():
+                bucket = found.get(k)
+                if bucket is not None:
+                    if isinstance(v, str):
+                        bucket.add(v)
+                    elif isinstance(v, list):
+                        for item in v:
+                            if isinstance(item, str):
+                                bucket.add(item)
+                            elif isinstance(item, dict) and "Name" in item:
+                                bucket.add(item["Name"])
+                    elif isinstance(v, dict) and "Name" in v:
+                        bucket.add(v["Name"])
+                if isinstance(v, (dict, list)):
+                    stack.append(v)
+        elif isinstance(node, list):
+            stack.extend(item for item in node if isinstance(item, (dict, list)))
+    return found
+
+
+def summarize_results(results: Any, keys: Optional[Iterable[str]] = None) -> dict[str, str]:
+    """Comma-separated, sorted strings per key, as the analysis endpoints return them."""
+    return {k: ", ".join(sorted(v)) for k, v in extract_strings(results, keys).items()}
+
+
+def summarize_item(item: Optional[dict], keys: Optional[Iterable[str]] = None) -> Optional[dict[str, str]]:
+    """Summary of a DynamoDB analysis item, or None while it has no results yet."""
+    if not item or "results" not in item:
+        return None
+    return summarize_results(_deserialize(item["results"]), keys)
+
+
+def _image_uuid(image_id: str) -> Optional[UUID]:
+    try:
+        return UUID(image_id)
+    except ValueError:
+        return None
+
+
+async def owned_summaries(
+    db: AsyncSession, user_id: UUID, image_ids: Iterable[str]
+) -> dict[str, Optional[dict[str, str]]]:
+    """
+    The ids among `image_ids` that are the user's images, each with the summary
+    precomputed into ImageAnalysis.results, or None if there is none yet.
+    """
+    uuids = {uuid: image_id for image_id in image_ids if (uuid := _image_uuid(image_id))}
+    if not uuids:
+        return {}
+    rows = await db.execute(
+        select(Image.id, ImageAnalysis.results)
+        .outerjoin(ImageAnalysis, ImageAnalysis.image_id == Image.id)
+        .where(Image.id.in_(uuids), Image.user_id == user_id)
+    )
+    return {uuids[row.id]: (row.results or {}).get("extracted") for row in rows}
+
+
+async def store_summaries(db: AsyncSession, summaries: dict[str, dict[str, str]]) -> None:
+    """
+    Precompute once: merge finished summaries into ImageAnalysis.results
+    under "extracted", leaving the worker's properties and status alone.
+    Ids without an ImageAnalysis row are skipped. The caller commits.
+    """
+    now = datetime.utcnow()
+    for image_id, summary in summaries.items():
+        uuid = _image_uuid(image_id)
+        if uuid is None:
+            continue
+        await db.execute(
+            update(ImageAnalysis)
+            .where(ImageAnalysis.image_id == uuid)
+            .values(
+                results=json_merge(db, ImageAnalysis.__table__.c.results, {"extracted": summary}),
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+class AnalysisStore:
+    """
+    Read path for image analyses. Finished summaries never change, so they
+    stay cached until evicted; an id without results yet is cached as pending
+    for `pending_ttl` seconds so polling clients do not hit DynamoDB on every
+    request. Read-only: summaries are precomputed into ImageAnalysis by the
+    analysis worker, and callers check there (owned_summaries) first.
+    """
+
+    def __init__(
+        self,
+        aws: AWSClients,
+        table_name: Optional[str] = None,
+        maxsize: Optional[int] = None,
+        pending_ttl: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        keys: Optional[Iterable[str]] = None,
+    ):
+        self.aws = aws
+        self.table_name = table_name or settings.ANALYSIS_TABLE_NAME
+        self.pending_ttl = settings.ANALYSIS_PENDING_TTL if pending_ttl is None else pending_ttl
+        self.max_attempts = max_attempts or settings.ANALYSIS_BATCH_MAX_ATTEMPTS
+        self.keys = tuple(keys or settings.ANALYSIS_EXTRACT_KEYS)
+        self._cache: TTLCache[str, object] = TTLCache(
+            maxsize=settings.ANALYSIS_CACHE_SIZE if maxsize is None else maxsize,
+        )
+
+    def _remember(self, image_id: str, summary: Optional[dict[str, str]]) -> None:
+        if summary is None:
+            if self.pending_ttl > 0:
+                self._cache.set(image_id, _PENDING, ttl=self.pending_ttl)
+        else:
+            self._cache.set(image_id, summary)
+
+    def _cached(self, image_id: str) -> tuple[bool, Optional[dict[str, str]]]:
+        value = self._cache.get(image_id)
+        if value is None:
+            return False, None
+        return True, None if value is _PENDING else value
+
+    async def get(self, image_id: str) -> Optional[dict[str, str]]:
+        hit, summary = self._cached(image_id)
+        if hit:
+            return summary
+        response = await self.aws.run(
+            self.aws.dynamodb.get_item,
+            TableName=self.table_name,
+            Key={"image-id": {"S": image_id}},
+            ProjectionExpression="#r",
+            ExpressionAttributeNames={"#r": "results"},
+        )
+        summary = summarize_item(response.get("Item"), self.keys)
+        self._remember(image_id, summary)
+        return summary
+
+    async def get_many(
+        self, image_ids: Iterable[str], recheck_pending: bool = False
+    ) -> dict[str, Optional[dict[str, str]]]:
+        """
+        Summaries for many ids, None where the analysis is still pending. Cache
+        misses are read with BatchGetItem, 100 keys per call; keys DynamoDB
+        leaves unprocessed are retried with backoff and, if they never come
+        back, reported as pending without being cached, as are the ids of a
+        call that fails outright. With recheck_pending, ids cached as pending
+        are read again (the worker's extract_labels, which paces itself).
+        """
+        found: dict[str, Optional[dict[str, str]]] = {}
+        missing = []
+        for image_id in dict.fromkeys(image_ids):
+            hit, summary = self._cached(image_id)
+            if hit and not (recheck_pending and summary is None):
+                found[image_id] = summary
+            else:
+                missing.append(image_id)
+
+        chunks = [missing[i:i + BATCH_GET_LIMIT] for i in range(0, len(missing), BATCH_GET_LIMIT)]
+        results = await asyncio.gather(*(self._batch_get(chunk) for chunk in chunks), return_exceptions=True)
+        for chunk, items in zip(chunks, results):
+            if isinstance(items, BaseException):
+                if not isinstance(items, Exception):
+                    raise items
+                logger.warning("Reading %d analyses failed, reporting them as pending: %s", len(chunk), items)
+                continue
+            for image_id, item in items.items():
+                summary = summarize_item(item, self.keys)
+                self._remember(image_id, summary)
+                found[image_id] = summary
+        for image_id in missing:
+            found.setdefault(image_id, None)
+        return found
+
+    async def _batch_get(self, image_ids: list[str]) -> dict[str, Optional[dict]]:
+        """Raw items by id (None when absent), for the ids DynamoDB actually answered."""
+        request = {
+            self.table_name: {
+                "Keys": [{"image-id": {"S": image_id}} for image_id in image_ids],
+                "ProjectionExpression": "#id, #r",
+                "ExpressionAttributeNames": {"#id": "image-id", "#r": "results"},
+            }
+        }
+        items: dict[str, Optional[dict]] = {}
+        answered = set(image_ids)
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(min(0.05 * 2 ** attempt, 1.0))
+            response = await self.aws.run(self.aws.dynamodb.batch_get_item, RequestItems=request)
+            for item in response.get("Responses", {}).get(self.table_name, []):
+                items[item["image-id"]["S"]] = item
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+        else:
+            for key in request[self.table_name]["Keys"]:
+                answered.discard(key["image-id"]["S"])
+        return {image_id: items.get(image_id) for image_id in answered}
+
+
+def get_analysis_store(request: Request) -> AnalysisStore:
+    return request.app.state.analysis
@@ -0,0 +1,317 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import and_, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.executors import BoundedProcessPool, PoolBusy
+from app.db.dialect import json_has_key, json_merge
+from app.models import ImageAnalysis, JobAnalysisStatus
+from app.services.analysis import BATCH_GET_LIMIT, AnalysisStore, store_summaries
+from app.services.aws import AWSClients
+from app.services.derivatives import DerivativeStore
+from app.services.image_properties import analyze_image
+from app.services.storage import fetch_source
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisWorker:
+    """
+    Moves ImageAnalysis rows from UPLOADED through PROCESSING to DONE or FAILED,
+    then renders the image's derivatives when given a DerivativeStore. A failed
+    render is only logged: the derivative route renders on first request.
+
+    A dispatcher task claims at most as many rows as it has free slots
+    (`concurrency`), so a backlog stays in the table instead of in memory, and
+    runs each one on a process pool with a timeout. Claiming is a single
+    UPDATE over a FOR UPDATE SKIP LOCKED subquery, so any number of app
+    processes can run a worker against the same Postgres database. A claim
+    is a lease: rows left PROCESSING by a crashed worker are claimed again
+    once `lease` seconds have passed. Failures are retried with exponential
+    backoff until `max_attempts`, then the row is marked FAILED.
+
+    Given an AnalysisStore, the label summary is stored with the properties
+    when DynamoDB already has it, and a second task copies in the rest as they
+    land, paging through recent images that have none yet, so the analysis
+    endpoints only read.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        aws: AWSClients,
+        processes: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        lease: Optional[float] = None,
+        derivatives: Optional[DerivativeStore] = None,
+        analysis: Optional[AnalysisStore] = None,
+    ):
+        self.session_factory = session_factory
+        self.aws = aws
+        self.concurrency = concurrency or settings.ANALYSIS_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.ANALYSIS_WORKER_POLL_INTERVAL
+        self.timeout = timeout or settings.ANALYSIS_WORKER_TIMEOUT
+        self.max_attempts = max_attempts or settings.ANALYSIS_WORKER_MAX_ATTEMPTS
+        self.retry_delay = settings.ANALYSIS_WORKER_RETRY_DELAY if retry_delay is None else retry_delay
+        self.lease = lease or settings.ANALYSIS_WORKER_LEASE
+        self.derivatives = derivatives
+        self.analysis = analysis
+        self.pool = BoundedProcessPool(
+            "image analysis",
+            max_workers=settings.ANALYSIS_WORKER_PROCESSES if processes is None else processes,
+            max_pending=self.concurrency,
+        )
+        self._wake = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._extractor: Optional[asyncio.Task] = None
+        self._extract_after: Optional[tuple[datetime, UUID]] = None
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if self.analysis is not None and self._extractor is None:
+            self._extractor = asyncio.create_task(self._extract())
+
+    async def stop(self) -> None:
+        """Stop claiming, hand in-flight rows back to the queue and shut the pool down."""
+        for task in (self._dispatcher, self._extractor):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._dispatcher = self._extractor = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.pool.shutdown()
+
+    def notify(self) -> None:
+        """Wake the dispatcher, e.g. right after an upload, instead of waiting for the next poll."""
+        self._wake.set()
+
+    async def _dispatch(self) -> None:
+        while True:
+            # Calls abandoned on a timeout keep their pool slot until the process finishes them
+            free = self.concurrency - max(len(self._tasks), self.pool.pending)
+            if free > 0:
+                try:
+                    claimed = await self.claim(free)
+                except Exception:
+                    logger.exception("Claiming image analyses failed")
+                    claimed = []
+                for row in claimed:
+                    task = asyncio.create_task(self._process(*row))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._finished)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._wake.set()
+
+    async def extract_labels(self) -> int:
+        """
+        Precompute summaries for the next page (one BatchGetItem) of recent
+        images that have none yet, oldest first; returns how many were stored.
+        Each call continues after the previous page and starts over after the
+        newest, so images still pending in DynamoDB are re-checked once per
+        pass instead of holding up the rest. Rows are taken FOR UPDATE SKIP
+        LOCKED, so concurrent workers read different pages.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.ANALYSIS_EXTRACT_WINDOW)
+        async with self.session_factory() as db:
+            query = select(ImageAnalysis.id, ImageAnalysis.image_id, ImageAnalysis.created_at).where(
+                ImageAnalysis.created_at >= cutoff,
+                ~json_has_key(db, ImageAnalysis.__table__.c.results, "extracted"),
+            )
+            if self._extract_after is not None:
+                query = query.where(tuple_(ImageAnalysis.created_at, ImageAnalysis.id) > self._extract_after)
+            query = (
+                query.order_by(ImageAnalysis.created_at, ImageAnalysis.id)
+                .limit(BATCH_GET_LIMIT)
+                .with_for_update(skip_locked=True)
+            )
+            rows = (await db.execute(query)).all()
+            # A short page ends the pass
+            self._extract_after = (rows[-1].created_at, rows[-1].id) if len(rows) == BATCH_GET_LIMIT else None
+            if not rows:
+                return 0
+            found = await self.analysis.get_many([str(row.image_id) for row in rows], recheck_pending=True)
+            summaries = {image_id: summary for image_id, summary in found.items() if summary is not None}
+            if summaries:
+                await store_summaries(db, summaries)
+            await db.commit()
+        return len(summaries)
+
+    async def _extract(self) -> None:
+        while True:
+            try:
+                await self.extract_labels()
+            except Exception:
+                logger.exception("Precomputing analysis summaries failed")
+            await asyncio.sleep(settings.ANALYSIS_EXTRACT_INTERVAL)
+
+    async def claim(self, limit: int) -> list[tuple[UUID, UUID, str, int, datetime]]:
+        """Mark up to `limit` claimable rows PROCESSING; returns (id, image id, storage path, attempt, claimed_at)."""
+        now = datetime.utcnow()
+        claimable = (
+            select(ImageAnalysis.id)
+            .where(or_(
+                and_(
+                    ImageAnalysis.status == JobAnalysisStatus.UPLOADED,
+                    or_(ImageAnalysis.next_attempt_at.is_(None), ImageAnalysis.next_attempt_at <= now),
+                ),
+                and_(
+                    ImageAnalysis.status == JobAnalysisStatus.PROCESSING,
+                    ImageAnalysis.claimed_at < now - timedelta(seconds=self.lease),
+                ),
+            ))
+            .order_by(ImageAnalysis.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(ImageAnalysis)
+                .where(ImageAnalysis.id.in_(claimable.scalar_subquery()))
+                .values(
+                    status=JobAnalysisStatus.PROCESSING,
+                    claimed_at=now,
+                    attempts=ImageAnalysis.attempts + 1,
+                    updated_at=now,
+                )
+                .returning(ImageAnalysis.id, ImageAnalysis.image_id, ImageAnalysis.s3_key, ImageAnalysis.attempts)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = [(row.id, row.image_id, row.s3_key, row.attempts, now) for row in result]
+            await db.commit()
+        return claimed
+
+    async def _process(
+        self, analysis_id: UUID, image_id: UUID, storage_path: str, attempt: int, claimed_at: datetime
+    ) -> None:
+        try:
+            source = await asyncio.wait_for(fetch_source(self.aws, storage_path), self.timeout)
+            properties = await asyncio.wait_for(
+                self.pool.run(analyze_image, source, settings.ANALYSIS_DOMINANT_COLOURS),
+                self.timeout,
+            )
+        except (asyncio.CancelledError, PoolBusy) as e:
+            # Shutting down, or no pool slot: give the claim back rather than waiting out the lease
+            await asyncio.shield(self._finish(analysis_id, claimed_at, status=JobAnalysisStatus.UPLOADED))
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        except Exception as e:
+            error = "Timed out" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            if attempt >= self.max_attempts:
+                await self._finish(analysis_id, claimed_at, status=JobAnalysisStatus.FAILED, error=error)
+            else:
+                delay = timedelta(seconds=self.retry_delay * 2 ** (attempt - 1))
+                await self._finish(
+                    analysis_id, claimed_at, status=JobAnalysisStatus.UPLOADED, error=error,
+                    next_attempt_at=datetime.utcnow() + delay,
+                )
+            return
+        results: dict[str, Any] = {"properties": properties}
+        summary = await self._summary(image_id)
+        if summary is not None:
+            results["extracted"] = summary
+        await self._finish(analysis_id, claimed_at, status=JobAnalysisStatus.DONE, results=results)
+        if self.derivatives is not None:
+            await self._render_derivatives(storage_path)
+
+    async def _render_derivatives(self, storage_path: str) -> None:
+        """Render thumbnails now so the first gallery view does not wait for them."""
+        try:
+            await asyncio.wait_for(self.derivatives.ensure(storage_path, cached=False), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Rendering the derivatives of %s failed", storage_path, exc_info=True)
+
+    async def _summary(self, image_id: UUID) -> Optional[dict[str, str]]:
+        """The label summary if DynamoDB has it already; otherwise extract_labels picks it up later."""
+        if self.analysis is None:
+            return None
+        try:
+            return await self.analysis.get(str(image_id))
+        except Exception:
+            logger.warning("Reading the analysis of image %s failed", image_id, exc_info=True)
+            return None
+
+    async def _finish(
+        self,
+        analysis_id: UUID,
+        claimed_at: datetime,
+        status: JobAnalysisStatus,
+        error: Optional[str] = None,
+        next_attempt_at: Optional[datetime] = None,
+        results: Optional[dict[str, Any]] = None,
+    ) -> None:
+        values: dict[str, Any] = {
+            "status": status,
+            "error": error,
+            "next_attempt_at": next_attempt_at,
+            "claimed_at": None,
+            "updated_at": datetime.utcnow(),
+        }
+        if status == JobAnalysisStatus.UPLOADED and error is None:
+            # Released, not failed: this attempt does not count
+            values["attempts"] = ImageAnalysis.attempts - 1
+        try:
+            async with self.session_factory() as db:
+                if results is not None:
+                    values["results"] = json_merge(db, ImageAnalysis.__table__.c.results, results)
+                # Only while our claim stands; a reclaimed row belongs to whoever claimed it since
+                await db.execute(
+                    update(ImageAnalysis)
+                    .where(ImageAnalysis.id == analysis_id, ImageAnalysis.claimed_at == claimed_at)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Recording image analysis %s failed; it will be reclaimed after the lease", analysis_id)
+
+
+def get_analysis_worker(request: Request) -> Optional[AnalysisWorker]:
+    return getattr(request.app.state, "analysis_worker", None)
+
+
+async def _main() -> None:
+    from app.db.session import AsyncSessionLocal, engine
+
+    engine.echo = False
+    aws = AWSClients()
+    derivatives = DerivativeStore(aws)
+    worker = AnalysisWorker(AsyncSessionLocal, aws, derivatives=derivatives, analysis=AnalysisStore(aws))
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        derivatives.shutdown()
+        aws.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # A standalone worker, for running analysis capacity separately from the API
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
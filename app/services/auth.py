@@ -1,26 +1,65 @@
+from uuid import UUID
+
 from fastapi import Depends, HTTPException, status
-from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
 
+from sqlalchemy import event
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import timed_phase
 from app.models.user import User, UserCreate, UserRead
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async, verify_access_token
 from app.db.session import get_session
-from app.core.security import SECRET_KEY, ALGORITHM
 
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+# Authenticated principals keyed by user id, so a verified token skips the user SELECT.
+# ORM updates and deletes of a user evict it in this process only; Core update()/delete()
+# and other processes are bounded by AUTH_PRINCIPAL_CACHE_TTL alone.
+principal_cache: TTLCache[UUID, User] = TTLCache(
+    maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE,
+    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+)
+
+
+def invalidate_principal(user_id: UUID) -> None:
+    principal_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User) -> None:
+    invalidate_principal(target.id)
+
+
+def _detached_principal(user: User) -> User:
+    # A fresh transient copy, so a cached principal is never bound to another request's session
+    return User(
+        id=user.id,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+        username=user.username,
+        email=user.email,
+        hashed_password=user.hashed_password,
+    )
+
+
+def token_claims(user: User) -> dict:
+    return {"sub": str(user.id), "email": user.email, "username": user.username}
+
 
 async def create_user(user_data: UserCreate, db: AsyncSession) -> UserRead:
     user = User(
         username=user_data.email.split('@')[0],  # Simple username generation
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password)
+        hashed_password=await get_password_hash_async(user_data.password)
     )
-    
+
     db.add(user)
     try:
         await db.commit()
@@ -28,7 +67,7 @@ async def create_user(user_data: UserCreate, db: AsyncSession) -> UserRead:
     except IntegrityError:
         await db.rollback()
         raise ValueError("User with this email already exists.")
-    
+
     return UserRead.model_validate(user)
 
 
@@ -36,29 +75,46 @@ async def login_user(email: str, password: str, db: AsyncSession) -> User | None
     statement = select(User).where(User.email == email)
     result = await db.execute(statement)
     user = result.scalar_one_or_none()
-    if user and verify_password(password, user.hashed_password):
+    if user and await verify_password_async(password, user.hashed_password):
         return user
     return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_session)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_session)) -> User:
+    with timed_phase("auth"):
+        return await _resolve_user(token, db)
+
+
+async def _resolve_user(token: str, db: AsyncSession) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    payload = verify_access_token(token)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+        user_id = UUID(payload.get("sub"))
+    except (TypeError, ValueError):
         raise credentials_exception
+
+    if settings.AUTH_CLAIMS_ONLY and "email" in payload:
+        # Trust the signed claims and skip the database entirely
+        return User(id=user_id, email=payload["email"], username=payload.get("username"), hashed_password="")
+
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+
     statement = select(User).where(User.id == user_id)
     result = await db.execute(statement)
     user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
+    user = _detached_principal(user)
+    principal_cache.set(user_id, user)
     return user
 
 
-
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
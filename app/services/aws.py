@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from fastapi import Request
+
+from app.core.config import Settings, settings
+from app.core.metrics import timed_phase
+
+T = TypeVar("T")
+
+
+class AWSClients:
+    """
+    Shared boto3 clients, created once per process in the lifespan handler.
+    boto3 clients are thread-safe, so blocking calls go through `run`, which
+    executes them on a bounded thread pool instead of the event loop.
+    """
+
+    def __init__(self, config: Settings = settings):
+        self.settings = config
+        self._session: Any = None
+        self._client_config: Any = None
+        self._clients: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.AWS_EXECUTOR_WORKERS,
+            thread_name_prefix="aws",
+        )
+
+    def _create_session(self) -> None:
+        # boto3 takes a few hundred ms to import, so it loads with the first client instead of at startup
+        import boto3
+        from botocore.config import Config
+
+        self._client_config = Config(
+            max_pool_connections=self.settings.AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=self.settings.AWS_CONNECT_TIMEOUT,
+            read_timeout=self.settings.AWS_READ_TIMEOUT,
+            retries={"max_attempts": self.settings.AWS_MAX_ATTEMPTS, "mode": "standard"},
+        )
+        self._session = boto3.session.Session(
+            aws_access_key_id=self.settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=self.settings.AWS_SECRET_ACCESS_KEY,
+            region_name=self.settings.AWS_REGION,
+        )
+
+    def client(self, service: str) -> Any:
+        client = self._clients.get(service)
+        if client is None:
+            # Session.client is not thread-safe, and we only want one per service
+            with self._lock:
+                client = self._clients.get(service)
+                if client is None:
+                    if self._session is None:
+                        self._create_session()
+                    client = self._session.client(
+                        service,
+                        endpoint_url=self.settings.AWS_ENDPOINT_URL or None,
+                        config=self._client_config,
+                    )
+                    self._clients[service] = client
+        return client
+
+    def preload(self, *services: str) -> None:
+        """Create clients in the background, so the first request using them does not import boto3 on the event loop."""
+        for service in services:
+            self._executor.submit(self.client, service)
+
+    @property
+    def s3(self) -> Any:
+        return self.client("s3")
+
+    @property
+    def dynamodb(self) -> Any:
+        return self.client("dynamodb")
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        with timed_phase("aws"):
+            return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+
+def get_aws(request: Request) -> AWSClients:
+    return request.app.state.aws
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from fastapi import UploadFile
+from sqlalchemy import delete, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models import Blob
+from app.services.aws import AWSClients
+from app.services.derivatives import DerivativeStore
+from app.services.similarity import perceptual_hash
+from app.services.storage import (
+    UploadStream, delete_stored, read_local, remove_local, s3_uri, write_local, write_s3,
+)
+
+
+def blob_key(content_hash: str) -> str:
+    return f"blobs/{content_hash[:2]}/{content_hash}"
+
+
+async def acquire_blob(db: AsyncSession, content_hash: str) -> Optional[Blob]:
+    """Take another reference on an existing blob, if these bytes are already stored."""
+    result = await db.execute(
+        update(Blob)
+        .where(Blob.content_hash == content_hash)
+        .values(ref_count=Blob.ref_count + 1, updated_at=datetime.utcnow())
+        .returning(Blob)
+    )
+    return result.scalar_one_or_none()
+
+
+async def store_staged(
+    db: AsyncSession,
+    staging_path: str,
+    content_hash: str,
+    size: int,
+    content_type: Optional[str] = None,
+    aws: Optional[AWSClients] = None,
+    s3_source_key: Optional[str] = None,
+) -> Blob:
+    """
+    Reference the blob for bytes already staged on local disk and hashed,
+    storing them first if they are new. Local blobs are moved out of
+    `staging_path`; with `s3_source_key` the same bytes are already in the
+    bucket and are copied server-side instead of uploaded again. The caller
+    removes what is left of the staged copies and commits.
+    """
+    blob = await acquire_blob(db, content_hash)
+    if blob is not None:
+        return blob
+
+    # Hashed from the staged copy, once per distinct content
+    phash = await perceptual_hash(staging_path)
+    key = blob_key(content_hash)
+    if aws is not None:
+        if s3_source_key is not None:
+            bucket = settings.AWS_S3_BUCKET_NAME
+            await aws.run(
+                aws.s3.copy_object, Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": s3_source_key}
+            )
+        else:
+            await write_s3(aws, read_local(staging_path), key, content_type=content_type)
+        storage_path = s3_uri(key)
+    else:
+        storage_path = os.path.join(settings.UPLOAD_DIR, key)
+        os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+        await asyncio.to_thread(os.replace, staging_path, storage_path)
+
+    # A concurrent upload of the same bytes may have won the race; it wrote identical content
+    now = datetime.utcnow()
+    statement = insert(db, Blob).values(
+        id=uuid.uuid4(),
+        created_at=now,
+        updated_at=now,
+        content_hash=content_hash,
+        size=size,
+        content_type=content_type,
+        storage_path=storage_path,
+        ref_count=1,
+        phash=phash,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Blob.content_hash],
+        set_={"ref_count": Blob.ref_count + 1, "updated_at": now},
+    ).returning(Blob)
+    result = await db.execute(statement)
+    return result.scalar_one()
+
+
+async def store_blob(file: UploadFile, db: AsyncSession, aws: Optional[AWSClients] = None) -> Blob:
+    """
+    Store an upload by content hash. The bytes are staged on local disk while
+    hashing; if a blob with the same hash exists the storage write is skipped
+    and only its reference count goes up. Pass `aws` to keep blobs in S3.
+    The caller commits.
+    """
+    staging_dir = os.path.join(settings.UPLOAD_DIR, ".staging")
+    staging_path = os.path.join(staging_dir, uuid.uuid4().hex)
+    stream = UploadStream(file)
+    await write_local(stream.chunks(), staging_path)
+    try:
+        return await store_staged(db, staging_path, stream.sha256, stream.size, file.content_type, aws)
+    finally:
+        await remove_local(staging_path)
+
+
+async def release_blob(
+    db: AsyncSession, blob_id: UUID, aws: AWSClients, derivatives: Optional[DerivativeStore] = None
+) -> None:
+    """Drop one reference; the last one deletes the stored bytes. The caller commits."""
+    result = await db.execute(
+        update(Blob)
+        .where(Blob.id == blob_id)
+        .values(ref_count=Blob.ref_count - 1, updated_at=datetime.utcnow())
+        .returning(Blob.ref_count, Blob.storage_path)
+    )
+    row = result.one_or_none()
+    if row is None or row.ref_count > 0:
+        return
+    deleted = await db.execute(delete(Blob).where(Blob.id == blob_id, Blob.ref_count <= 0))
+    if deleted.rowcount:
+        # Delete the bytes while the row delete is uncommitted, so a concurrent
+        # upload of the same content waits on the lock and then re-stores them
+        await delete_stored(aws, row.storage_path)
+        if derivatives is not None:
+            await derivatives.delete(row.storage_path)
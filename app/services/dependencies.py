@@ -1,5 +1,9 @@
+import base64
+import json
+from typing import Any, Optional
+
 from pydantic import BaseModel
-from fastapi import Query
+from fastapi import HTTPException, Query, status
 
 class PaginationParams(BaseModel):
     skip: int = 0
@@ -9,4 +13,23 @@ def pagination_params(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to return")
 ) -> PaginationParams:
-    return PaginationParams(skip=skip, limit=limit)
\ No newline at end of file
+    return PaginationParams(skip=skip, limit=limit)
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def cursor_params(
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from the previous page; takes precedence over skip")
+) -> Optional[list]:
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return values
@@ -0,0 +1,132 @@
+import asyncio
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.executors import BoundedProcessPool
+from app.services.aws import AWSClients
+from app.services.image_properties import render_derivatives
+from app.services.storage import delete_stored, fetch_source, s3_key_from_uri, write_local
+
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+
+
+def derivative_path(storage_path: str, name: str) -> str:
+    """Where a derivative lives: next to the original, local path or s3:// URI alike."""
+    return f"{storage_path}.{name}.jpg"
+
+
+async def _single(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+class DerivativeStore:
+    """
+    Resized copies of stored originals, rendered on a process pool. All sizes
+    are rendered together, either by the analysis worker after an upload or
+    on the first request that finds them missing. Concurrent requests for the
+    same original share one render instead of each resizing it.
+    """
+
+    def __init__(
+        self,
+        aws: AWSClients,
+        sizes: Optional[dict[str, int]] = None,
+        processes: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.aws = aws
+        self.sizes = sizes or settings.IMAGE_DERIVATIVE_SIZES
+        self.pool = BoundedProcessPool(
+            "image derivatives",
+            max_workers=settings.IMAGE_DERIVATIVE_WORKERS if processes is None else processes,
+            max_pending=max_pending or settings.IMAGE_DERIVATIVE_MAX_PENDING,
+        )
+        # Only S3 presence is cached: a local stat is cheap and always current
+        self._present: TTLCache[str, bool] = TTLCache(
+            maxsize=settings.IMAGE_DERIVATIVE_CACHE_SIZE, ttl=settings.IMAGE_DERIVATIVE_CACHE_TTL
+        )
+        self._rendering: dict[str, asyncio.Task] = {}
+
+    async def ensure(self, storage_path: str, name: Optional[str] = None, cached: bool = True) -> str:
+        """
+        Path of the `name` derivative (the first size by default), rendering all
+        sizes if it is missing. With cached=False storage is checked even if this
+        process saw the derivative before, e.g. for a newly stored blob whose
+        path a since-deleted blob with the same content also had.
+        """
+        name = name or next(iter(self.sizes))
+        if name not in self.sizes:
+            raise KeyError(name)
+        path = derivative_path(storage_path, name)
+        if not (cached and storage_path in self._present):
+            if await self._exists(path):
+                self._remember(storage_path)
+            else:
+                await self._render_once(storage_path)
+        return path
+
+    def _remember(self, storage_path: str) -> None:
+        if storage_path.startswith("s3://"):
+            self._present.set(storage_path, True)
+
+    async def _render_once(self, storage_path: str) -> None:
+        task = self._rendering.get(storage_path)
+        if task is None:
+            task = asyncio.create_task(self._render(storage_path))
+            self._rendering[storage_path] = task
+            task.add_done_callback(lambda _: self._rendering.pop(storage_path, None))
+        # A caller going away must not cancel the render the others are waiting on
+        await asyncio.shield(task)
+
+    async def _render(self, storage_path: str) -> None:
+        source = await fetch_source(self.aws, storage_path)
+        rendered = await self.pool.run(
+            render_derivatives, source, self.sizes, settings.IMAGE_DERIVATIVE_QUALITY
+        )
+        await asyncio.gather(*(
+            self._write(derivative_path(storage_path, name), data) for name, data in rendered.items()
+        ))
+        self._remember(storage_path)
+
+    async def _exists(self, path: str) -> bool:
+        if not path.startswith("s3://"):
+            return await asyncio.to_thread(os.path.exists, path)
+        from botocore.exceptions import ClientError
+
+        try:
+            await self.aws.run(self.aws.s3.head_object, Bucket=settings.AWS_S3_BUCKET_NAME, Key=s3_key_from_uri(path))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def _write(self, path: str, data: bytes) -> None:
+        if not path.startswith("s3://"):
+            await write_local(_single(data), path)
+            return
+        await self.aws.run(
+            self.aws.s3.put_object,
+            Bucket=settings.AWS_S3_BUCKET_NAME,
+            Key=s3_key_from_uri(path),
+            Body=data,
+            ContentType=DERIVATIVE_CONTENT_TYPE,
+            CacheControl=f"private, max-age={settings.IMAGE_DERIVATIVE_MAX_AGE}, immutable",
+        )
+
+    async def delete(self, storage_path: str) -> None:
+        self._present.pop(storage_path)
+        await asyncio.gather(*(
+            delete_stored(self.aws, derivative_path(storage_path, name)) for name in self.sizes
+        ))
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+
+def get_derivatives(request: Request) -> DerivativeStore:
+    return request.app.state.derivatives
@@ -1,18 +1,42 @@
 from uuid import UUID
 from fastapi import UploadFile
-from app.models import Image
+from sqlalchemy import delete
+from app.models import Blob, Image, ImageAnalysis
+from app.services.aws import AWSClients
+from app.services.blob import release_blob, store_blob
+from app.services.derivatives import DerivativeStore
+from app.services.storage import delete_stored
 from sqlmodel.ext.asyncio.session import AsyncSession
-import os
 from typing import Optional
 
-async def save_image(user_id: UUID, file: UploadFile, db: AsyncSession, upload_dir: str = "uploads") -> Optional[Image]:
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, file.filename)
-    contents = await file.read()
-    with open(file_path, "wb") as buffer:
-        buffer.write(contents)
-    image = Image(file_path=file_path, user_id=user_id)
+async def add_image(user_id: UUID, blob: Blob, db: AsyncSession) -> Image:
+    """An Image for a stored blob, queued for the analysis worker in the same transaction. The caller commits."""
+    image = Image(file_path=blob.storage_path, user_id=user_id, blob_id=blob.id, phash=blob.phash)
     db.add(image)
+    await db.flush()
+    db.add(ImageAnalysis(image_id=image.id, s3_key=blob.storage_path))
+    return image
+
+
+async def save_image(user_id: UUID, file: UploadFile, db: AsyncSession, aws: Optional[AWSClients] = None) -> Optional[Image]:
+    blob = await store_blob(file, db, aws)
+    image = await add_image(user_id, blob, db)
     await db.commit()
     await db.refresh(image)
     return image
+
+
+async def remove_image(
+    image: Image, db: AsyncSession, aws: AWSClients, derivatives: Optional[DerivativeStore] = None
+) -> None:
+    await db.execute(delete(ImageAnalysis).where(ImageAnalysis.image_id == image.id))
+    await db.delete(image)
+    await db.flush()
+    if image.blob_id is not None:
+        await release_blob(db, image.blob_id, aws, derivatives)
+    elif image.file_path.startswith("s3://"):
+        # Images stored before blobs existed own their object outright
+        await delete_stored(aws, image.file_path)
+        if derivatives is not None:
+            await derivatives.delete(image.file_path)
+    await db.commit()
@@ -0,0 +1,95 @@
+"""
+CPU-bound image work run in process pools: analysis for the analysis worker
+and resized derivatives. Kept free of app imports so spawned worker processes
+start quickly.
+"""
+import io
+from typing import Optional, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Colours and histograms are computed on a downscaled copy; the shape of the
+# distribution barely changes and the cost stops depending on the upload size
+SAMPLE_SIZE = (256, 256)
+HISTOGRAM_BINS = 16
+
+
+def _histogram(image: Image.Image) -> dict[str, list[float]]:
+    counts = image.histogram()  # 256 counts per band, R then G then B
+    pixels = image.width * image.height
+    step = 256 // HISTOGRAM_BINS
+    histogram = {}
+    for band, name in enumerate(("r", "g", "b")):
+        channel = counts[band * 256:(band + 1) * 256]
+        histogram[name] = [round(sum(channel[i:i + step]) / pixels, 4) for i in range(0, 256, step)]
+    return histogram
+
+
+def _dominant_colours(image: Image.Image, colours: int) -> list[dict]:
+    quantized = image.quantize(colors=colours, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette() or []
+    pixels = image.width * image.height
+    dominant = []
+    for count, index in sorted(quantized.getcolors(), reverse=True):
+        r, g, b = palette[index * 3:index * 3 + 3]
+        dominant.append({"hex": f"#{r:02x}{g:02x}{b:02x}", "rgb": [r, g, b], "fraction": round(count / pixels, 4)})
+    return dominant
+
+
+def analyze_image(source: Union[str, bytes], colours: int = 5) -> dict:
+    """Dimensions, format, dominant colours and a per-channel histogram for a file path or raw bytes."""
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        properties = {
+            "width": image.width,
+            "height": image.height,
+            "format": image.format,
+            "mode": image.mode,
+        }
+        # Lets JPEG decode straight at a reduced scale
+        image.draft("RGB", SAMPLE_SIZE)
+        sample = image.convert("RGB")
+    sample.thumbnail(SAMPLE_SIZE)
+    properties["dominant_colours"] = _dominant_colours(sample, colours)
+    properties["histogram"] = _histogram(sample)
+    return properties
+
+
+def render_derivatives(source: Union[str, bytes], sizes: dict[str, int], quality: int = 85) -> dict[str, bytes]:
+    """
+    JPEG derivatives no larger than size x size for each name in `sizes`, in
+    one decode. Larger sizes are rendered first and each smaller one is
+    resized from the previous result. Images are never upscaled.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        largest = max(sizes.values())
+        image.draft("RGB", (largest, largest))
+        current = ImageOps.exif_transpose(image).convert("RGB")
+    rendered = {}
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        current = current.copy()
+        current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        current.save(buffer, "JPEG", quality=quality, optimize=True)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def dhash(source: Union[str, bytes]) -> Optional[int]:
+    """
+    Difference hash: each of the 64 bits says whether a pixel of a 9 x 8
+    greyscale thumbnail is brighter than its right neighbour. Returned as a
+    signed 64-bit integer so it fits a BIGINT column; None for non-images.
+    """
+    size = 8
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+            image.draft("L", (size * 8, size * 8))
+            pixels = list(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata())
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.jobs import NHSJob
+
+JOB_FIELDS = (
+    "title", "date_posted", "salary", "contract", "reference_number",
+    "address", "closing_date", "sponsored", "link",
+)
+
+
+class IngestResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+
+
+def parse_date(value: Any) -> date:
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        # The format the API renders, e.g. "11 July 2025"
+        return datetime.strptime(value, "%d %B %Y").date()
+
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "t")
+
+
+def normalize_job(record: dict) -> dict:
+    job = {field: record[field] for field in JOB_FIELDS}
+    for field in ("title", "salary", "contract", "reference_number", "address", "link"):
+        job[field] = str(job[field]).strip()
+    if not job["reference_number"]:
+        raise ValueError("reference_number is required")
+    job["date_posted"] = parse_date(job["date_posted"])
+    job["closing_date"] = parse_date(job["closing_date"])
+    job["sponsored"] = parse_bool(job["sponsored"])
+    return job
+
+
+def read_feed(stream: IO[str], fmt: str) -> Iterator[dict]:
+    """Yield raw records from a CSV (with header row) or JSONL text stream."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None  # counted as invalid by take_batch
+    else:
+        raise ValueError(f"Unsupported feed format: {fmt}")
+
+
+def take_batch(records: Iterator[dict], size: int) -> tuple[list[dict], int]:
+    """Next `size` records, normalized; returns the valid jobs and the invalid count."""
+    jobs, invalid = [], 0
+    for record in islice(records, size):
+        try:
+            jobs.append(normalize_job(record))
+        except (KeyError, TypeError, ValueError):
+            invalid += 1
+    return jobs, invalid
+
+
+async def upsert_jobs(db: AsyncSession, jobs: list[dict], result: IngestResult) -> None:
+    """Insert new postings and update changed ones by reference_number, in one statement."""
+    # Later rows in a batch win, as they would with row-by-row upserts
+    by_reference = {job["reference_number"]: job for job in jobs}
+    existing = await db.execute(
+        select(*(getattr(NHSJob, field) for field in JOB_FIELDS))
+        .where(NHSJob.reference_number.in_(by_reference))
+    )
+    current = {row.reference_number: dict(row._mapping) for row in existing}
+
+    changed = []
+    for reference, job in by_reference.items():
+        if reference not in current:
+            result.inserted += 1
+        elif current[reference] != job:
+            result.updated += 1
+        else:
+            result.unchanged += 1
+            continue
+        changed.append(job)
+    # Rows superseded by a later duplicate in the same batch are not written
+    result.unchanged += len(jobs) - len(by_reference)
+    if not changed:
+        return
+
+    now = datetime.utcnow()
+    statement = insert(db, NHSJob)
+    statement = statement.on_conflict_do_update(
+        index_elements=[NHSJob.reference_number],
+        set_={
+            **{field: getattr(statement.excluded, field) for field in JOB_FIELDS if field != "reference_number"},
+            "updated_at": now,
+        },
+    )
+    # executemany form, which SQLAlchemy batches into multi-row VALUES without recompiling per batch
+    await db.execute(statement, [
+        {"id": uuid.uuid4(), "created_at": now, "updated_at": now, **job} for job in changed
+    ])
+
+
+async def ingest_jobs(
+    db: AsyncSession,
+    stream: IO[str],
+    fmt: str,
+    batch_size: Optional[int] = None,
+) -> IngestResult:
+    """
+    Stream a job feed into nhs_jobs in batches, committing after each one.
+    Reading and parsing run in a worker thread so the event loop stays free.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    records = read_feed(stream, fmt)
+    result = IngestResult()
+    while True:
+        jobs, invalid = await asyncio.to_thread(take_batch, records, batch_size)
+        result.invalid += invalid
+        if not jobs and not invalid:
+            return result
+        if jobs:
+            await upsert_jobs(db, jobs, result)
+            await db.commit()
+
+
+def open_upload(binary: IO[bytes]) -> IO[str]:
+    return io.TextIOWrapper(binary, encoding="utf-8", newline="")
+
+
+async def _main(paths: Iterable[str], fmt: Optional[str], batch_size: Optional[int]) -> None:
+    from app.db.session import AsyncSessionLocal, engine
+
+    engine.echo = False
+    async with AsyncSessionLocal() as db:
+        for path in paths:
+            feed_format = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+            with open(path, newline="", encoding="utf-8") as stream:
+                result = await ingest_jobs(db, stream, feed_format, batch_size)
+            print(f"{path}: {result.model_dump_json()}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upsert NHS job feeds (CSV or JSONL) into nhs_jobs.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+    asyncio.run(_main(args.paths, args.format, args.batch_size))
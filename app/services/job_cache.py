@@ -0,0 +1,120 @@
+import hashlib
+from datetime import date
+from typing import Any, Optional
+from uuid import UUID
+
+from fastapi import Request, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.jobs import NHSJob, UserJobAction
+
+
+async def jobs_version(db: AsyncSession, user_id: UUID) -> tuple:
+    """
+    What a user's job listings depend on, read from index-only aggregates:
+    the newest job change and the job count, and the user's newest action and
+    action count. The counts catch deletes, which leave the maxima unchanged
+    unless the newest row went. The date is included because closed jobs drop
+    out at midnight.
+    """
+    latest_job = select(func.max(NHSJob.updated_at)).scalar_subquery()
+    job_count = select(func.count()).select_from(NHSJob).scalar_subquery()
+    user_actions = select(func.max(UserJobAction.timestamp), func.count()).where(UserJobAction.user_id == user_id)
+    result = await db.execute(user_actions.add_columns(latest_job, job_count))
+    latest_action, action_count, latest_job_change, jobs = result.one()
+    return (str(latest_job_change), jobs, str(latest_action), action_count, date.today().isoformat())
+
+
+def make_etag(user_id: UUID, version: tuple, request: Request) -> str:
+    params = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(repr((str(user_id), version, request.url.path, params)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+class JobResponseCache:
+    """
+    Rendered job listing pages per user, keyed by path and query string and
+    served only while their ETag still matches the current version. Users
+    and each user's pages are both evicted LRU.
+    """
+
+    def __init__(self, max_users: Optional[int] = None, pages_per_user: Optional[int] = None):
+        self.pages_per_user = settings.JOB_RESPONSE_CACHE_PAGES_PER_USER if pages_per_user is None else pages_per_user
+        self._users: TTLCache[UUID, TTLCache[str, tuple[str, bytes]]] = TTLCache(
+            maxsize=settings.JOB_RESPONSE_CACHE_USERS if max_users is None else max_users,
+        )
+
+    @staticmethod
+    def _page_key(request: Request) -> str:
+        return f"{request.url.path}?{request.url.query}"
+
+    def get(self, user_id: UUID, request: Request, etag: str) -> Optional[bytes]:
+        pages = self._users.get(user_id)
+        entry = pages.get(self._page_key(request)) if pages is not None else None
+        if entry is None or entry[0] != etag:
+            return None
+        return entry[1]
+
+    def set(self, user_id: UUID, request: Request, etag: str, body: bytes) -> None:
+        pages = self._users.get(user_id)
+        if pages is None:
+            pages = TTLCache(maxsize=self.pages_per_user)
+            self._users.set(user_id, pages)
+        pages.set(self._page_key(request), (etag, body))
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        self._users.pop(user_id)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+def cached_response(body: bytes, etag: str) -> Response:
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    # Per-user content: browsers may keep it but must revalidate every time
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+async def cached_page(
+    request: Request, db: AsyncSession, user_id: UUID, cache: JobResponseCache
+) -> tuple[str, Optional[Response]]:
+    """
+    The current ETag for this listing, plus a ready response when the client's
+    copy (304) or the cached page is still current; None means render it.
+    """
+    etag = make_etag(user_id, await jobs_version(db, user_id), request)
+    if etag_matches(request, etag):
+        return etag, not_modified(etag)
+    body = cache.get(user_id, request, etag)
+    if body is not None:
+        return etag, cached_response(body, etag)
+    return etag, None
+
+
+def store_page(request: Request, user_id: UUID, cache: JobResponseCache, etag: str, content: Any) -> Response:
+    response = ORJSONResponse(content, headers=cache_headers(etag))
+    cache.set(user_id, request, etag, response.body)
+    return response
+
+
+def get_job_cache(request: Request) -> JobResponseCache:
+    return request.app.state.job_cache
@@ -0,0 +1,111 @@
+import asyncio
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import and_, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.jobs import JobActionEnum, UserJobAction, UserJobDailyStat
+
+Windows = dict[str, tuple[int, Optional[int]]]
+
+
+def window_bounds(today: date, windows: Windows) -> dict[str, tuple[date, Optional[date]]]:
+    """Turn (start, end) days-before-today pairs into [start_day, end_day) dates."""
+    return {
+        name: (today - timedelta(days=start), today - timedelta(days=end) if end is not None else None)
+        for name, (start, end) in windows.items()
+    }
+
+
+async def record_job_action(db: AsyncSession, user_id: UUID, action: JobActionEnum, day: date, count: int = 1) -> None:
+    """Bump the daily counter inside the caller's transaction, next to the action insert."""
+    now = datetime.utcnow()
+    statement = insert(db, UserJobDailyStat).values(
+        id=uuid.uuid4(),
+        created_at=now,
+        updated_at=now,
+        user_id=user_id,
+        day=day,
+        action=action,
+        count=count,
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[UserJobDailyStat.user_id, UserJobDailyStat.day, UserJobDailyStat.action],
+        set_={"count": UserJobDailyStat.count + count, "updated_at": now},
+    ))
+
+
+async def count_job_actions(
+    db: AsyncSession,
+    user_id: UUID,
+    action: JobActionEnum = JobActionEnum.APPLIED,
+    windows: Optional[Windows] = None,
+    source: Optional[str] = None,
+    today: Optional[date] = None,
+) -> dict[str, int]:
+    """All window counts in one aggregate query, from the daily counters or the raw actions."""
+    bounds = window_bounds(today or date.today(), windows or settings.JOB_STATS_WINDOWS)
+    if not bounds:
+        return {}
+    earliest = min(start for start, _ in bounds.values())
+
+    daily = (source or settings.JOB_STATS_SOURCE) == "daily"
+    model = UserJobDailyStat if daily else UserJobAction
+    column = UserJobDailyStat.day if daily else UserJobAction.timestamp
+    value = func.sum(UserJobDailyStat.count) if daily else func.count()
+
+    def bound(day: date):
+        return day if daily else datetime.combine(day, time.min)
+
+    columns = []
+    for name, (start, end) in bounds.items():
+        condition = column >= bound(start)
+        if end is not None:
+            condition = and_(condition, column < bound(end))
+        columns.append(func.coalesce(value.filter(condition), 0).label(name))
+
+    result = await db.execute(
+        select(*columns).where(model.user_id == user_id, model.action == action, column >= bound(earliest))
+    )
+    return dict(result.one()._mapping)
+
+
+async def rebuild_daily_stats(db: AsyncSession) -> None:
+    """Recompute every daily counter from user_job_actions."""
+    day = func.date(UserJobAction.timestamp)
+    grouped = await db.execute(
+        select(UserJobAction.user_id, day.label("day"), UserJobAction.action, func.count().label("count"))
+        .group_by(UserJobAction.user_id, day, UserJobAction.action)
+    )
+    now = datetime.utcnow()
+    await db.execute(delete(UserJobDailyStat))
+    rows = [
+        UserJobDailyStat(
+            created_at=now,
+            updated_at=now,
+            user_id=row.user_id,
+            day=row.day if isinstance(row.day, date) else date.fromisoformat(row.day),
+            action=row.action,
+            count=row.count,
+        )
+        for row in grouped
+    ]
+    db.add_all(rows)
+    await db.commit()
+
+
+async def _rebuild() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        await rebuild_daily_stats(db)
+
+
+if __name__ == "__main__":
+    asyncio.run(_rebuild())
@@ -0,0 +1,169 @@
+import re
+import uuid
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import case, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.jobs import JobActionEnum, NHSJob, UserJobAction, job_search_query, job_search_vector
+from app.services.job_stats import record_job_action
+
+
+def search_tokens(search: Optional[str]) -> list[str]:
+    return re.findall(r"\w+", search.lower()) if search else []
+
+
+def use_fulltext(db: AsyncSession) -> bool:
+    # SQLite (tests, benchmarks) has no tsvector, so it keeps the ILIKE search
+    return settings.JOBS_SEARCH_FULLTEXT and db.bind.dialect.name == "postgresql"
+
+
+def available_jobs_query(
+    user_id: UUID,
+    sponsored: Optional[bool] = None,
+    search: Optional[str] = None,
+    now: Optional[datetime] = None,
+    fulltext: bool = False,
+):
+    """Open jobs the user has not acted on yet, before sorting and pagination."""
+    # Correlated NOT EXISTS, answered from the (user_id, job_id) unique index
+    already_actioned = (
+        select(UserJobAction.id)
+        .where(UserJobAction.user_id == user_id, UserJobAction.job_id == NHSJob.id)
+        .exists()
+    )
+    query = select(NHSJob).where(~already_actioned)
+    if sponsored is not None:
+        query = query.where(NHSJob.sponsored == sponsored)
+    tokens = search_tokens(search)
+    if fulltext and tokens:
+        query = query.where(job_search_vector.op("@@")(job_search_query(tokens)))
+    elif search:
+        query = query.where(NHSJob.title.ilike(f"%{search}%"))
+    # Filter jobs where closing_date is in the future (>= now)
+    return query.where(NHSJob.closing_date >= (now or datetime.now()))
+
+
+def search_relevance(search: str, fulltext: bool = False):
+    """Order-by expression ranking the best matches first."""
+    tokens = search_tokens(search)
+    if fulltext and tokens:
+        return func.ts_rank_cd(job_search_vector, job_search_query(tokens)).desc()
+    # Without full-text search, titles starting with the term come first
+    return case((NHSJob.title.ilike(f"{search}%"), 0), else_=1)
+
+
+
+async def apply_job_actions(
+    db: AsyncSession,
+    user_id: UUID,
+    actions: dict[UUID, JobActionEnum],
+    overwrite: bool = False,
+) -> dict[UUID, str]:
+    """
+    Record many job actions for one user in one transaction: a single insert
+    on (user_id, job_id) that skips jobs already actioned, then, with
+    overwrite, the rows it skipped are locked and those with a different
+    action updated. Outcomes and counter changes come from the rows as
+    inserted or locked, so a concurrent batch cannot make them disagree.
+    Returns an outcome per job id: created, updated, exists or unknown_job.
+    """
+    known = await db.execute(select(NHSJob.id).where(NHSJob.id.in_(actions)))
+    known_ids = set(known.scalars().all())
+    outcomes = {job_id: "unknown_job" for job_id in actions if job_id not in known_ids}
+    candidates = [job_id for job_id in actions if job_id in known_ids]
+    now = datetime.now()
+    counter_changes: Counter = Counter()
+
+    created: set[UUID] = set()
+    if candidates:
+        statement = insert(db, UserJobAction).on_conflict_do_nothing(
+            index_elements=[UserJobAction.user_id, UserJobAction.job_id]
+        )
+        result = await db.execute(
+            statement.returning(UserJobAction.job_id),
+            [
+                {
+                    "id": uuid.uuid4(), "created_at": now, "updated_at": now,
+                    "user_id": user_id, "job_id": job_id, "action": actions[job_id], "timestamp": now,
+                }
+                for job_id in candidates
+            ],
+        )
+        created = set(result.scalars().all())
+    for job_id in created:
+        outcomes[job_id] = "created"
+        counter_changes[(actions[job_id], now.date())] += 1
+
+    conflicting = [job_id for job_id in candidates if job_id not in created]
+    if overwrite and conflicting:
+        # The insert waited out any concurrent insert of these rows, so they are all visible to lock now
+        locked = await db.execute(
+            select(UserJobAction.job_id, UserJobAction.action, UserJobAction.timestamp)
+            .where(UserJobAction.user_id == user_id, UserJobAction.job_id.in_(conflicting))
+            .with_for_update()
+        )
+        previous = {row.job_id: row for row in locked if row.action != actions[row.job_id]}
+        for action in set(actions[job_id] for job_id in previous):
+            await db.execute(
+                update(UserJobAction)
+                .where(
+                    UserJobAction.user_id == user_id,
+                    UserJobAction.job_id.in_([job_id for job_id in previous if actions[job_id] == action]),
+                )
+                .values(action=action, timestamp=now, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        for job_id, row in previous.items():
+            outcomes[job_id] = "updated"
+            counter_changes[(actions[job_id], now.date())] += 1
+            counter_changes[(row.action, row.timestamp.date())] -= 1
+    for job_id in conflicting:
+        outcomes.setdefault(job_id, "exists")
+
+    for (action, day), count in counter_changes.items():
+        if count:
+            await record_job_action(db, user_id, action, day, count)
+    await db.commit()
+    return {job_id: outcomes[job_id] for job_id in actions}
+
+
+# Only what JobOut renders, selected as plain rows instead of hydrated ORM objects
+JOB_OUT_COLUMNS = (
+    NHSJob.id, NHSJob.title, NHSJob.date_posted, NHSJob.salary, NHSJob.contract,
+    NHSJob.reference_number, NHSJob.address, NHSJob.closing_date, NHSJob.sponsored, NHSJob.link,
+)
+
+
+@lru_cache(maxsize=4096)
+def format_date(dt: date) -> str:
+    # Listings repeat a small set of posting/closing dates, so strftime runs once per date
+    if not dt:
+        return ""
+    return dt.strftime("%d %B %Y")  # e.g., "11 July 2025"
+
+
+def serialize_job_rows(rows: Iterable[Any]) -> list[dict]:
+    """Render JOB_OUT_COLUMNS rows in JobOut's shape, ready for orjson."""
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "date_posted": format_date(row.date_posted),
+            "salary": row.salary,
+            "contract": row.contract,
+            "reference_number": row.reference_number,
+            "address": row.address,
+            "closing_date": format_date(row.closing_date),
+            "sponsored": row.sponsored,
+            "link": row.link,
+        }
+        for row in rows
+    ]
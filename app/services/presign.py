@@ -0,0 +1,47 @@
+from typing import Optional
+
+from fastapi import Request
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.aws import AWSClients
+
+
+class PresignedUrlCache:
+    """
+    Hands out presigned GET URLs, reusing a previously signed URL until it is
+    within `safety_margin` seconds of expiring. Entries are keyed by
+    (s3_key, expires_in) and evicted LRU once `maxsize` is reached.
+    """
+
+    def __init__(
+        self,
+        aws: AWSClients,
+        maxsize: Optional[int] = None,
+        safety_margin: Optional[float] = None,
+    ):
+        self.aws = aws
+        self.safety_margin = settings.PRESIGNED_URL_SAFETY_MARGIN if safety_margin is None else safety_margin
+        self._cache: TTLCache[tuple[str, int], str] = TTLCache(
+            maxsize=settings.PRESIGNED_URL_CACHE_SIZE if maxsize is None else maxsize,
+        )
+
+    def get_url(self, s3_key: str, expires_in: Optional[int] = None) -> str:
+        expires_in = expires_in or settings.PRESIGNED_URL_EXPIRES_IN
+        key = (s3_key, expires_in)
+        url = self._cache.get(key)
+        if url is None:
+            # Signing is local CPU work, no need to leave the event loop
+            url = self.aws.s3.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": settings.AWS_S3_BUCKET_NAME, "Key": s3_key},
+                ExpiresIn=expires_in,
+            )
+            ttl = expires_in - self.safety_margin
+            if ttl > 0:
+                self._cache.set(key, url, ttl=ttl)
+        return url
+
+
+def get_presigned_urls(request: Request) -> PresignedUrlCache:
+    return request.app.state.presigned_urls
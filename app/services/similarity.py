@@ -0,0 +1,204 @@
+import asyncio
+from itertools import combinations
+from typing import Callable, Hashable, Iterable, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.executors import BoundedProcessPool
+from app.models import Image
+from app.services.image_properties import dhash
+
+HASH_BITS = 64
+_UNSIGNED = (1 << HASH_BITS) - 1
+
+# Decoding an upload for its hash is CPU work, kept off the event loop like bcrypt
+hash_pool = BoundedProcessPool(
+    "image hashing",
+    max_workers=settings.IMAGE_HASH_WORKERS,
+    max_pending=settings.IMAGE_HASH_MAX_PENDING,
+)
+
+
+async def perceptual_hash(path: str) -> Optional[int]:
+    return await hash_pool.run(dhash, path)
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over 64-bit hashes. Each hash is split into `chunks`
+    16-bit pieces with one table per piece. Two hashes within distance r must
+    agree to within r // chunks bits on at least one piece (pigeonhole), so a
+    query only probes the buckets that close to its own pieces and checks
+    the full distance on what it finds. Adds and removes are O(chunks).
+    """
+
+    def __init__(self, chunks: int = 4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._hashes: dict[Hashable, int] = {}
+        self._tables: list[dict[int, set[Hashable]]] = [{} for _ in range(chunks)]
+        self._probes: dict[int, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _pieces(self, value: int) -> list[int]:
+        return [(value >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def _flips(self, radius: int) -> list[int]:
+        """Every chunk-sized bit mask with at most `radius` bits set."""
+        masks = self._probes.get(radius)
+        if masks is None:
+            masks = [
+                sum(1 << bit for bit in bits)
+                for r in range(radius + 1)
+                for bits in combinations(range(self.chunk_bits), r)
+            ]
+            self._probes[radius] = masks
+        return masks
+
+    def add(self, key: Hashable, value: int) -> None:
+        self.remove(key)
+        value &= _UNSIGNED
+        self._hashes[key] = value
+        for table, piece in zip(self._tables, self._pieces(value)):
+            table.setdefault(piece, set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, piece in zip(self._tables, self._pieces(value)):
+            bucket = table[piece]
+            bucket.discard(key)
+            if not bucket:
+                del table[piece]
+
+    def search(self, value: int, max_distance: int) -> list[tuple[int, Hashable]]:
+        """(distance, key) for every stored hash within max_distance, nearest first."""
+        value &= _UNSIGNED
+        flips = self._flips(max_distance // self.chunks)
+        if len(flips) * self.chunks >= len(self._hashes):
+            # Probing would touch more buckets than there are hashes
+            candidates: Iterable[Hashable] = self._hashes
+        else:
+            found: set[Hashable] = set()
+            for table, piece in zip(self._tables, self._pieces(value)):
+                for flip in flips:
+                    bucket = table.get(piece ^ flip)
+                    if bucket:
+                        found |= bucket
+            candidates = found
+        matches = []
+        for key in candidates:
+            distance = (self._hashes[key] ^ value).bit_count()
+            if distance <= max_distance:
+                matches.append((distance, key))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class SimilarityIndex:
+    """
+    One HammingIndex of image hashes per user, loaded from the database on
+    first use and kept up to date as this process adds and removes images.
+    Users are evicted LRU, and indexes are reloaded after `ttl` seconds so
+    changes made by other processes show up. Loads use their own session from
+    `session_factory`, since they outlive the request that started them when
+    it is cancelled.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_users: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self._indexes: TTLCache[UUID, HammingIndex] = TTLCache(
+            maxsize=settings.SIMILARITY_INDEX_USERS if max_users is None else max_users,
+            ttl=settings.SIMILARITY_INDEX_TTL if ttl is None else ttl,
+        )
+        self._loading: dict[UUID, asyncio.Task] = {}
+
+    async def for_user(self, user_id: UUID) -> HammingIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+        # Requests arriving while the index loads share the one query
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: UUID) -> HammingIndex:
+        index = HammingIndex()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Image.id, Image.phash).where(Image.user_id == user_id, Image.phash.is_not(None))
+            )
+            for image_id, phash in result:
+                index.add(image_id, phash)
+        self._indexes.set(user_id, index)
+        return index
+
+    def added(self, image: Image) -> None:
+        index = self._indexes.get(image.user_id)
+        if index is not None and image.phash is not None:
+            index.add(image.id, image.phash)
+
+    def removed(self, image: Image) -> None:
+        index = self._indexes.get(image.user_id)
+        if index is not None:
+            index.remove(image.id)
+
+
+def get_similarity_index(request: Request) -> SimilarityIndex:
+    return request.app.state.similarity
+
+
+async def backfill_hashes(db: AsyncSession, aws) -> int:
+    """Hash blobs stored before perceptual hashing existed and copy the hash onto their images."""
+    from sqlalchemy import update
+
+    from app.models import Blob
+    from app.services.storage import fetch_source
+
+    result = await db.execute(select(Blob.id, Blob.storage_path).where(Blob.phash.is_(None)))
+    hashed = 0
+    for blob_id, storage_path in result.all():
+        phash = await hash_pool.run(dhash, await fetch_source(aws, storage_path))
+        if phash is None:
+            continue
+        await db.execute(update(Blob).where(Blob.id == blob_id).values(phash=phash))
+        await db.execute(update(Image).where(Image.blob_id == blob_id).values(phash=phash))
+        await db.commit()
+        hashed += 1
+    return hashed
+
+
+async def _backfill() -> None:
+    from app.db.session import AsyncSessionLocal, engine
+    from app.services.aws import AWSClients
+
+    engine.echo = False
+    aws = AWSClients()
+    try:
+        async with AsyncSessionLocal() as db:
+            print(f"hashed {await backfill_hashes(db, aws)} blobs")
+    finally:
+        aws.close()
+        hash_pool.shutdown()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_backfill())
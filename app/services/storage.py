@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import AsyncIterator, Optional, Union
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.services.aws import AWSClients
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadStream:
+    """
+    Reads an upload in fixed-size chunks, keeping a running byte count and sha256.
+    Fails with UploadTooLarge as soon as the stream grows past max_bytes.
+    """
+
+    def __init__(self, file: UploadFile, chunk_size: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.file = file
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        self.max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        if self.file.size is not None and self.file.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte limit.")
+        await self.file.seek(0)
+        while chunk := await self.file.read(self.chunk_size):
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte limit.")
+            self._digest.update(chunk)
+            yield chunk
+
+
+async def write_local(chunks: AsyncIterator[bytes], file_path: str) -> None:
+    """Write chunks to a temporary sibling off the event loop, then move it into place."""
+    await asyncio.to_thread(os.makedirs, os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+    fh = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(fh.write, chunk)
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(os.replace, tmp_path, file_path)
+    except BaseException:
+        await asyncio.to_thread(fh.close)
+        await remove_local(tmp_path)
+        raise
+
+
+async def read_local(file_path: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    fh = await asyncio.to_thread(open, file_path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(fh.read, chunk_size):
+            yield chunk
+    finally:
+        fh.close()
+
+
+async def remove_local(file_path: str) -> None:
+    try:
+        await asyncio.to_thread(os.remove, file_path)
+    except FileNotFoundError:
+        pass
+
+
+async def write_s3(
+    aws: AWSClients,
+    chunks: AsyncIterator[bytes],
+    key: str,
+    content_type: Optional[str] = None,
+    part_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> None:
+    """
+    Stream chunks into S3. Anything smaller than one part is a single PUT;
+    larger bodies become a multipart upload with up to `concurrency` parts in
+    flight, so memory stays around part_size * (concurrency + 1).
+    """
+    bucket = settings.AWS_S3_BUCKET_NAME
+    part_size = part_size or settings.S3_MULTIPART_PART_SIZE
+    extra = {"ContentType": content_type} if content_type else {}
+
+    buffer = bytearray()
+    parts = chunks.__aiter__()
+    async for chunk in parts:
+        buffer += chunk
+        if len(buffer) >= part_size:
+            break
+    else:
+        await aws.run(aws.s3.put_object, Bucket=bucket, Key=key, Body=bytes(buffer), **extra)
+        return
+
+    upload = await aws.run(aws.s3.create_multipart_upload, Bucket=bucket, Key=key, **extra)
+    upload_id = upload["UploadId"]
+    slots = asyncio.Semaphore(concurrency or settings.S3_MULTIPART_CONCURRENCY)
+    tasks: list[asyncio.Task] = []
+
+    async def upload_part(number: int, body: bytes) -> dict:
+        try:
+            response = await aws.run(
+                aws.s3.upload_part,
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body,
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            slots.release()
+
+    async def flush(body: bytes) -> None:
+        await slots.acquire()
+        tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, body)))
+
+    async def flush_full_parts() -> None:
+        while len(buffer) >= part_size:
+            await flush(bytes(buffer[:part_size]))
+            del buffer[:part_size]
+
+    try:
+        await flush_full_parts()
+        async for chunk in parts:
+            buffer += chunk
+            await flush_full_parts()
+        if buffer:
+            await flush(bytes(buffer))
+        completed = await asyncio.gather(*tasks)
+        await aws.run(
+            aws.s3.complete_multipart_upload,
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": completed},
+        )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await aws.run(aws.s3.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+
+def s3_uri(key: str) -> str:
+    return f"s3://{settings.AWS_S3_BUCKET_NAME}/{key}"
+
+
+def s3_key_from_uri(storage_path: str) -> str:
+    return storage_path.split("/", 3)[-1]
+
+
+async def fetch_source(aws: AWSClients, storage_path: str) -> Union[str, bytes]:
+    """Something PIL can open in another process: local paths as they are, S3 objects as bytes."""
+    if not storage_path.startswith("s3://"):
+        return storage_path
+
+    def fetch() -> bytes:
+        response = aws.s3.get_object(Bucket=settings.AWS_S3_BUCKET_NAME, Key=s3_key_from_uri(storage_path))
+        return response["Body"].read()
+
+    return await aws.run(fetch)
+
+
+async def delete_stored(aws: AWSClients, storage_path: str) -> None:
+    if storage_path.startswith("s3://"):
+        await aws.run(aws.s3.delete_object, Bucket=settings.AWS_S3_BUCKET_NAME, Key=s3_key_from_uri(storage_path))
+    else:
+        await remove_local(storage_path)
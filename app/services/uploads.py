@@ -0,0 +1,554 @@
+"""
+Resumable uploads. A client creates a session for a declared size, PATCHes
+chunks at chunk-aligned offsets (in any order, several at once), asks for
+the offset to resume from after a dropped connection, and finalizes.
+
+Production stages the chunks as the parts of an S3 multipart upload (part
+number = offset // chunk_size + 1); elsewhere each is a file of its own in
+the session's staging directory. Finalizing hashes the assembled
+bytes and goes through the same content-addressed blob store as
+`upload_image`. It is claimed with a conditional UPDATE and completed in
+the transaction that inserts the Image, so a session only ever creates one
+Image: a finalize retried afterwards returns it, while one that arrives
+during another gets UploadConflict and should retry.
+
+A chunk is received and staged without holding a database connection, so
+slow clients do not tie up the pool. Only recording it takes a lock on the
+session row, and a local chunk is moved into place under that lock, so a
+finalize's claim waits for chunks being recorded and later chunks see the
+claim and are discarded.
+
+Sessions with no chunk for UPLOAD_SESSION_TTL are garbage-collected by
+UploadCollector, or by `python -m app.services.uploads` run from cron. An
+S3 lifecycle rule aborting incomplete multipart uploads is a sensible
+backstop for anything the collector misses.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, delete, exists, func, or_, update
+from sqlalchemy.future import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models import Image, UploadPart, UploadSession, UploadSessionRead, UploadStatus
+from app.services.aws import AWSClients
+from app.services.blob import store_staged
+from app.services.image import add_image
+from app.services.storage import UploadTooLarge, remove_local, s3_key_from_uri, s3_uri
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts smaller than this, except the last
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class InvalidChunk(ValueError):
+    pass
+
+
+class UploadIncomplete(ValueError):
+    def __init__(self, missing: list[int]):
+        super().__init__(f"Chunks {missing[:20]} have not been received.")
+        self.missing = missing
+
+
+class UploadConflict(RuntimeError):
+    pass
+
+
+class UploadGone(LookupError):
+    pass
+
+
+def _client_error_code(e: Exception) -> Optional[str]:
+    return getattr(e, "response", {}).get("Error", {}).get("Code")
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def _concat_hashing(sources: list[str], target: str) -> tuple[str, int]:
+    """Concatenate `sources` into `target`, returning the sha256 and size of what was written."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with open(target, "wb") as dst:
+        for source in sources:
+            with open(source, "rb") as src:
+                while chunk := src.read(settings.UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    dst.write(chunk)
+    return digest.hexdigest(), size
+
+
+def chunk_count(upload: UploadSession) -> int:
+    return max(1, math.ceil(upload.size / upload.chunk_size))
+
+
+def _part_path(upload: UploadSession, number: int) -> str:
+    return os.path.join(upload.staging_path, f"{number:05d}")
+
+
+def _recent_chunk(now: datetime):
+    """Sessions that received a chunk within the TTL are still in use, whatever their expires_at says."""
+    return exists().where(
+        UploadPart.upload_id == UploadSession.id,
+        UploadPart.updated_at >= now - timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+    )
+
+
+async def _lock_open(db: AsyncSession, upload_id: UUID) -> bool:
+    """
+    Lock the session against a finalize claim until the caller's transaction
+    ends; False if it is no longer open. Postgres takes a shared row lock, so
+    chunks of one session are still written in parallel; SQLite has only the
+    database write lock, which a no-op UPDATE takes.
+    """
+    if db.bind.dialect.name == "postgresql":
+        result = await db.execute(
+            select(UploadSession.status).where(UploadSession.id == upload_id).with_for_update(read=True)
+        )
+        return result.scalar_one_or_none() == UploadStatus.OPEN
+    result = await db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.status == UploadStatus.OPEN)
+        .values(status=UploadStatus.OPEN)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(result.rowcount)
+
+
+async def create_upload(
+    db: AsyncSession, user_id: UUID, size: int, content_type: Optional[str] = None, aws: Optional[AWSClients] = None
+) -> UploadSession:
+    """Open a session for `size` bytes. Pass `aws` to stage the chunks as an S3 multipart upload."""
+    if size > settings.UPLOAD_SESSION_MAX_BYTES:
+        raise UploadTooLarge(f"File exceeds the {settings.UPLOAD_SESSION_MAX_BYTES} byte limit.")
+    chunk_size = settings.UPLOAD_SESSION_CHUNK_SIZE
+    if aws is not None and chunk_size < S3_MIN_PART_SIZE:
+        raise RuntimeError(f"UPLOAD_SESSION_CHUNK_SIZE must be at least {S3_MIN_PART_SIZE} bytes for S3")
+
+    upload_id = uuid.uuid4()
+    upload = UploadSession(
+        id=upload_id,
+        user_id=user_id,
+        size=size,
+        chunk_size=chunk_size,
+        content_type=content_type,
+        staging_path="",
+        expires_at=datetime.utcnow() + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+    )
+    if aws is not None:
+        key = f"uploads/{upload_id}"
+        extra = {"ContentType": content_type} if content_type else {}
+        response = await aws.run(
+            aws.s3.create_multipart_upload, Bucket=settings.AWS_S3_BUCKET_NAME, Key=key, **extra
+        )
+        upload.staging_path = s3_uri(key)
+        upload.s3_upload_id = response["UploadId"]
+    else:
+        upload.staging_path = os.path.join(settings.UPLOAD_DIR, ".uploads", upload_id.hex)
+        await asyncio.to_thread(os.makedirs, upload.staging_path, exist_ok=True)
+
+    db.add(upload)
+    await db.commit()
+    await db.refresh(upload)
+    return upload
+
+
+async def get_upload(db: AsyncSession, upload_id: UUID, user_id: UUID) -> Optional[UploadSession]:
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def read_chunk(chunks: AsyncIterator[bytes], expected: int) -> bytes:
+    """The request body, which must be exactly `expected` bytes."""
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > expected:
+            raise InvalidChunk(f"Chunk is longer than the {expected} bytes expected at this offset.")
+    if len(body) != expected:
+        raise InvalidChunk(f"Received {len(body)} of the {expected} bytes expected at this offset.")
+    return bytes(body)
+
+
+async def _stage_chunk(upload: UploadSession, number: int, data: bytes, aws: Optional[AWSClients]) -> Optional[str]:
+    """Send the chunk to S3 (returning its ETag) or write it beside its part file (returning that path)."""
+    if upload.s3_upload_id is None:
+        staged = f"{_part_path(upload, number)}.{uuid.uuid4().hex}.tmp"
+        await asyncio.to_thread(_write_file, staged, data)
+        return staged
+    try:
+        response = await aws.run(
+            aws.s3.upload_part,
+            Bucket=settings.AWS_S3_BUCKET_NAME,
+            Key=s3_key_from_uri(upload.staging_path),
+            UploadId=upload.s3_upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+    except Exception as e:
+        if _client_error_code(e) == "NoSuchUpload":
+            raise UploadConflict("Upload is already finished.")
+        raise
+    return response["ETag"]
+
+
+async def write_chunk(
+    db: AsyncSession, upload: UploadSession, offset: int, chunks: AsyncIterator[bytes], aws: Optional[AWSClients] = None
+) -> UploadPart:
+    """
+    Store the chunk starting at `offset`. Chunks may arrive in any order and
+    concurrently; sending one again replaces it, so a chunk whose response
+    was lost can simply be retried.
+
+    The body is read and staged outside any transaction. An S3 part cannot
+    be taken back, but finalizing completes the multipart upload with the
+    ETags recorded here, so S3 rejects one replaced during a finalize.
+    """
+    if upload.status != UploadStatus.OPEN:
+        raise UploadConflict(f"Upload is {upload.status.value}.")
+    if offset < 0 or offset >= upload.size or offset % upload.chunk_size:
+        raise InvalidChunk(f"Offset must be a multiple of {upload.chunk_size} below {upload.size}.")
+    # Ends the transaction the caller's lookup started, returning its connection to the pool
+    await db.commit()
+
+    number = offset // upload.chunk_size + 1
+    data = await read_chunk(chunks, min(upload.chunk_size, upload.size - offset))
+    staged = await _stage_chunk(upload, number, data, aws)
+    local = upload.s3_upload_id is None
+    try:
+        if not await _lock_open(db, upload.id):
+            await db.rollback()
+            raise UploadConflict("Upload is being finalized.")
+        if local:
+            await asyncio.to_thread(os.replace, staged, _part_path(upload, number))
+
+        now = datetime.utcnow()
+        etag = None if local else staged
+        statement = insert(db, UploadPart).values(
+            id=uuid.uuid4(), created_at=now, updated_at=now,
+            upload_id=upload.id, number=number, size=len(data), etag=etag,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[UploadPart.upload_id, UploadPart.number],
+            set_={"size": len(data), "etag": etag, "updated_at": now},
+        ).returning(UploadPart)
+        part = (await db.execute(statement)).scalar_one()
+        await db.commit()
+    finally:
+        if local:
+            await remove_local(staged)
+    return part
+
+
+async def received_parts(db: AsyncSession, upload: UploadSession) -> list[int]:
+    result = await db.execute(
+        select(UploadPart.number).where(UploadPart.upload_id == upload.id).order_by(UploadPart.number)
+    )
+    return list(result.scalars().all())
+
+
+async def describe_upload(db: AsyncSession, upload: UploadSession) -> UploadSessionRead:
+    received = await received_parts(db, upload)
+    result = await db.execute(select(func.max(UploadPart.updated_at)).where(UploadPart.upload_id == upload.id))
+    last_chunk = result.scalar_one_or_none()
+    expires_at = upload.expires_at
+    if last_chunk is not None:
+        expires_at = max(expires_at, last_chunk + timedelta(seconds=settings.UPLOAD_SESSION_TTL))
+    contiguous = 0
+    for number in received:
+        if number != contiguous + 1:
+            break
+        contiguous = number
+    offset = upload.size if upload.status == UploadStatus.COMPLETE else min(contiguous * upload.chunk_size, upload.size)
+    return UploadSessionRead(
+        id=upload.id,
+        created_at=upload.created_at,
+        updated_at=upload.updated_at,
+        size=upload.size,
+        chunk_size=upload.chunk_size,
+        content_type=upload.content_type,
+        status=upload.status,
+        offset=offset,
+        received=received,
+        image_id=upload.image_id,
+        expires_at=expires_at,
+    )
+
+
+async def _completed_image(db: AsyncSession, upload: UploadSession) -> Image:
+    image = await db.get(Image, upload.image_id)
+    if image is None:
+        raise UploadGone("The image created by this upload has been deleted.")
+    return image
+
+
+async def _assemble_s3(db: AsyncSession, upload: UploadSession, staged: str, aws: AWSClients) -> tuple[str, int]:
+    """Complete the multipart upload, then download the object to `staged`, hashing it on the way."""
+    bucket = settings.AWS_S3_BUCKET_NAME
+    key = s3_key_from_uri(upload.staging_path)
+    result = await db.execute(
+        select(UploadPart.number, UploadPart.etag).where(UploadPart.upload_id == upload.id).order_by(UploadPart.number)
+    )
+    try:
+        await aws.run(
+            aws.s3.complete_multipart_upload,
+            Bucket=bucket, Key=key, UploadId=upload.s3_upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in result.all()]},
+        )
+    except Exception as e:
+        code = _client_error_code(e)
+        if code == "InvalidPart":
+            raise UploadConflict("A chunk was sent again while finalizing; retry.")
+        # Already completed by an earlier finalize that failed after this step
+        if code != "NoSuchUpload":
+            raise
+
+    def download() -> tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        body = aws.s3.get_object(Bucket=bucket, Key=key)["Body"]
+        with open(staged, "wb") as fh:
+            for chunk in body.iter_chunks(settings.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                fh.write(chunk)
+        return digest.hexdigest(), size
+
+    return await aws.run(download)
+
+
+async def _discard_staging(upload: UploadSession, aws: Optional[AWSClients]) -> None:
+    if upload.s3_upload_id is None:
+        await asyncio.to_thread(shutil.rmtree, upload.staging_path, ignore_errors=True)
+        return
+    bucket = settings.AWS_S3_BUCKET_NAME
+    key = s3_key_from_uri(upload.staging_path)
+    try:
+        await aws.run(aws.s3.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload.s3_upload_id)
+    except Exception as e:
+        if _client_error_code(e) != "NoSuchUpload":
+            raise
+    # The assembled object, if a finalize got that far
+    await aws.run(aws.s3.delete_object, Bucket=bucket, Key=key)
+
+
+async def _finalize(db: AsyncSession, upload: UploadSession, token: UUID, aws: Optional[AWSClients]) -> Image:
+    staged = os.path.join(settings.UPLOAD_DIR, ".staging", uuid.uuid4().hex)
+    try:
+        if upload.s3_upload_id is not None:
+            content_hash, size = await _assemble_s3(db, upload, staged, aws)
+        else:
+            parts = [_part_path(upload, number) for number in range(1, chunk_count(upload) + 1)]
+            content_hash, size = await asyncio.to_thread(_concat_hashing, parts, staged)
+        if size != upload.size:
+            raise InvalidChunk(f"Assembled {size} bytes, expected {upload.size}.")
+        if upload.s3_upload_id is not None:
+            blob = await store_staged(
+                db, staged, content_hash, size, upload.content_type, aws,
+                s3_source_key=s3_key_from_uri(upload.staging_path),
+            )
+        else:
+            blob = await store_staged(db, staged, content_hash, size, upload.content_type)
+
+        image = await add_image(upload.user_id, blob, db)
+        now = datetime.utcnow()
+        completed = await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload.id, UploadSession.finalize_token == token)
+            .values(
+                status=UploadStatus.COMPLETE,
+                image_id=image.id,
+                finalize_token=None,
+                updated_at=now,
+                expires_at=now + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if not completed.rowcount:
+            raise UploadConflict("Finalizing outlasted its lease and was taken over.")
+        await db.execute(delete(UploadPart).where(UploadPart.upload_id == upload.id))
+        await db.commit()
+    finally:
+        await remove_local(staged)
+
+    try:
+        await _discard_staging(upload, aws)
+    except Exception:
+        # The collector retries once the session expires
+        logger.exception("Removing the staged chunks of upload %s failed", upload.id)
+    await db.refresh(image)
+    await db.refresh(upload)
+    return image
+
+
+async def finalize_upload(db: AsyncSession, upload: UploadSession, aws: Optional[AWSClients] = None) -> Image:
+    """
+    Assemble the chunks into a blob and create the session's Image, once.
+    A finalize retried after it succeeded returns the same Image, or raises
+    UploadGone if that image has since been deleted; one arriving while
+    another is in progress raises UploadConflict.
+    """
+    if upload.status == UploadStatus.COMPLETE:
+        return await _completed_image(db, upload)
+    received = await received_parts(db, upload)
+    missing = sorted(set(range(1, chunk_count(upload) + 1)) - set(received))
+    if missing:
+        raise UploadIncomplete(missing)
+
+    token = uuid.uuid4()
+    now = datetime.utcnow()
+    claimed = await db.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload.id,
+            or_(
+                UploadSession.status == UploadStatus.OPEN,
+                and_(
+                    UploadSession.status == UploadStatus.FINALIZING,
+                    UploadSession.updated_at < now - timedelta(seconds=settings.UPLOAD_SESSION_FINALIZE_LEASE),
+                ),
+            ),
+        )
+        .values(status=UploadStatus.FINALIZING, finalize_token=token, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if not claimed.rowcount:
+        await db.refresh(upload)
+        if upload.status == UploadStatus.COMPLETE:
+            return await _completed_image(db, upload)
+        raise UploadConflict("Upload is already being finalized; retry once it finishes.")
+
+    upload_id = upload.id
+    try:
+        return await _finalize(db, upload, token, aws)
+    except Exception:
+        await db.rollback()
+        # Hand the session back so the client can retry
+        await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_id, UploadSession.finalize_token == token)
+            .values(status=UploadStatus.OPEN, finalize_token=None, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        raise
+
+
+async def _remove(db: AsyncSession, upload: UploadSession, aws: Optional[AWSClients], *conditions) -> bool:
+    """Delete the session if `conditions` still hold, then its staged chunks."""
+    await db.execute(delete(UploadPart).where(UploadPart.upload_id == upload.id))
+    deleted = await db.execute(delete(UploadSession).where(UploadSession.id == upload.id, *conditions))
+    if not deleted.rowcount:
+        await db.rollback()
+        return False
+    await db.commit()
+    await _discard_staging(upload, aws)
+    return True
+
+
+async def abort_upload(db: AsyncSession, upload: UploadSession, aws: Optional[AWSClients] = None) -> None:
+    if not await _remove(db, upload, aws, UploadSession.status == UploadStatus.OPEN):
+        raise UploadConflict("Upload is being finalized or already finished.")
+
+
+async def collect_expired_uploads(db: AsyncSession, aws: Optional[AWSClients] = None, limit: int = 1000) -> int:
+    """Remove up to `limit` expired sessions, skipping finalizes still within their lease. Returns how many."""
+    now = datetime.utcnow()
+    unleased = or_(
+        UploadSession.status != UploadStatus.FINALIZING,
+        UploadSession.updated_at < now - timedelta(seconds=settings.UPLOAD_SESSION_FINALIZE_LEASE),
+    )
+    idle = and_(UploadSession.expires_at < now, ~_recent_chunk(now))
+    result = await db.execute(
+        select(UploadSession)
+        .where(idle, unleased)
+        .order_by(UploadSession.expires_at)
+        .limit(limit)
+    )
+    expired = result.scalars().all()
+    # Detached, so a rollback for one session does not expire the others
+    db.expunge_all()
+    collected = 0
+    for upload in expired:
+        try:
+            # Re-checked at delete time: a chunk may have arrived since
+            if await _remove(db, upload, aws, idle, unleased):
+                collected += 1
+        except Exception:
+            await db.rollback()
+            logger.exception("Collecting expired upload %s failed", upload.id)
+    return collected
+
+
+class UploadCollector:
+    """Periodically garbage-collects abandoned upload sessions."""
+
+    def __init__(
+        self, session_factory: Callable[[], AsyncSession], aws: AWSClients, interval: Optional[float] = None
+    ):
+        self.session_factory = session_factory
+        self.aws = aws
+        self.interval = settings.UPLOAD_SESSION_GC_INTERVAL if interval is None else interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def collect(self) -> int:
+        async with self.session_factory() as db:
+            collected = await collect_expired_uploads(db, self.aws)
+        if collected:
+            logger.info("Removed %d abandoned upload sessions", collected)
+        return collected
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.collect()
+            except Exception:
+                logger.exception("Collecting abandoned upload sessions failed")
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+async def _main() -> None:
+    from app.db.session import AsyncSessionLocal, engine
+
+    aws = AWSClients()
+    try:
+        await UploadCollector(AsyncSessionLocal, aws).collect()
+    finally:
+        aws.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # One collection pass, for deployments that run it from cron instead of in the API process
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
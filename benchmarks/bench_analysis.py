@@ -0,0 +1,98 @@
+"""
+Gallery-page analysis lookups against moto's in-memory DynamoDB: one get_item
+per image (the old behaviour), one BatchGetItem round, and a warm cache. Also
+checks that pending analyses are negatively cached and that keys left in
+UnprocessedKeys are retried.
+
+    python -m benchmarks.bench_analysis --images 100
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import configure_env
+
+
+def seed(client, table: str, count: int, pending: int) -> list[str]:
+    client.create_table(
+        TableName=table,
+        KeySchema=[{"AttributeName": "image-id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "image-id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    ids = [f"image-{i}" for i in range(count)]
+    for i, image_id in enumerate(ids):
+        item = {"image-id": {"S": image_id}}
+        if i >= pending:
+            item["results"] = {"M": {"Labels": {"L": [
+                {"M": {"Name": {"S": f"Label {i}"}, "Categories": {"L": [{"M": {"Name": {"S": "Animals"}}}]}}},
+            ]}}}
+        client.put_item(TableName=table, Item=item)
+    return ids
+
+
+async def timed(label: str, coro, count: int):
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {elapsed * 1000:>9.2f} ms  {elapsed / count * 1e6:>8.1f} us/image")
+    return result
+
+
+async def run(count: int, pending: int) -> None:
+    from app.core.config import settings
+    from app.services.analysis import AnalysisStore
+    from app.services.aws import AWSClients
+
+    aws = AWSClients()
+    ids = seed(aws.dynamodb, settings.ANALYSIS_TABLE_NAME, count, pending)
+    try:
+        uncached = AnalysisStore(aws, maxsize=0)
+        await timed("get_item per image", asyncio.gather(*(uncached.get(i) for i in ids)), count)
+
+        store = AnalysisStore(aws)
+        found = await timed("batch_get_item", store.get_many(ids), count)
+        assert sum(v is None for v in found.values()) == pending, "pending analyses reported as found"
+        await timed("warm cache", store.get_many(ids), count)
+
+        # Every first call leaves half the keys unprocessed, as a throttled table would
+        real_batch_get = aws.dynamodb.batch_get_item
+        calls = []
+
+        def throttled(RequestItems):
+            calls.append(1)
+            keys = RequestItems[settings.ANALYSIS_TABLE_NAME]["Keys"]
+            if len(calls) == 1 and len(keys) > 1:
+                half = len(keys) // 2
+                response = real_batch_get(RequestItems={
+                    settings.ANALYSIS_TABLE_NAME: {**RequestItems[settings.ANALYSIS_TABLE_NAME], "Keys": keys[:half]}
+                })
+                response["UnprocessedKeys"] = {
+                    settings.ANALYSIS_TABLE_NAME: {**RequestItems[settings.ANALYSIS_TABLE_NAME], "Keys": keys[half:]}
+                }
+                return response
+            return real_batch_get(RequestItems=RequestItems)
+
+        aws.dynamodb.batch_get_item = throttled
+        sample = ids[pending:pending + min(100, count - pending)]
+        retried = await AnalysisStore(aws).get_many(sample)
+        assert all(v is not None for v in retried.values()), "unprocessed keys were not retried"
+        print(f"unprocessed keys retried  {len(calls)} BatchGetItem calls for {len(sample)} ids")
+    finally:
+        aws.close()
+
+
+def main(count: int, pending: int) -> None:
+    from moto import mock_aws
+
+    with mock_aws():
+        asyncio.run(run(count, pending))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--pending", type=int, default=10)
+    args = parser.parse_args()
+    configure_env()
+    main(args.images, args.pending)
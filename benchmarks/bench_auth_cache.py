@@ -0,0 +1,41 @@
+"""
+Requests per second for /api/jobs/all with and without the principal cache,
+and in claims-only mode.
+
+    python -m benchmarks.bench_auth_cache --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import app_client, configure_env, print_row, run_load, signup_and_login
+
+
+async def main(total: int, concurrency: int) -> None:
+    from app.core.config import settings
+    from app.services import auth
+
+    async with app_client() as client:
+        headers = await signup_and_login(client)
+
+        async def list_jobs():
+            response = await client.get("/api/jobs/all", headers=headers)
+            response.raise_for_status()
+
+        maxsize = auth.principal_cache.maxsize
+        for label, size in (("without principal cache", 0), ("with principal cache", maxsize)):
+            auth.principal_cache.clear()
+            auth.principal_cache.maxsize = size
+            await run_load(list_jobs, min(total, 100), concurrency)  # warm-up
+            print_row(label, await run_load(list_jobs, total, concurrency))
+
+        settings.AUTH_CLAIMS_ONLY = True
+        print_row("claims-only", await run_load(list_jobs, total, concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    configure_env()
+    asyncio.run(main(args.requests, args.concurrency))
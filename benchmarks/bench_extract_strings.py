@@ -0,0 +1,87 @@
+"""
+extract_strings on Rekognition-style label payloads of increasing size: the
+previous recursive version (kept here as the reference) against the
+single-pass iterative one, checking both return the same sets.
+
+    python -m benchmarks.bench_extract_strings --labels 100 1000 5000
+"""
+import argparse
+import time
+
+from benchmarks.common import configure_env
+
+
+def recursive_extract_strings(data, keys=("Categories", "Name", "Parents")):
+    result = {k: set() for k in keys}
+    if isinstance(data, dict):
+        for k, v in data.items():
+            for key in keys:
+                if k == key:
+                    if isinstance(v, str):
+                        result[key].add(v)
+                    elif isinstance(v, list):
+                        for item in v:
+                            if isinstance(item, dict) and "Name" in item:
+                                result[key].add(item["Name"])
+                            elif isinstance(item, str):
+                                result[key].add(item)
+                    elif isinstance(v, dict) and "Name" in v:
+                        result[key].add(v["Name"])
+            sub_result = recursive_extract_strings(v, keys)
+            for key in keys:
+                result[key].update(sub_result[key])
+    elif isinstance(data, list):
+        for item in data:
+            sub_result = recursive_extract_strings(item, keys)
+            for key in keys:
+                result[key].update(sub_result[key])
+    return result
+
+
+def label_payload(labels: int) -> dict:
+    return {
+        "LabelModelVersion": "3.0",
+        "Labels": [
+            {
+                "Name": f"Label {i}",
+                "Confidence": 90.5,
+                "Instances": [
+                    {"BoundingBox": {"Width": 0.1, "Height": 0.2, "Left": 0.3, "Top": 0.4}, "Confidence": 88.0}
+                    for _ in range(i % 3)
+                ],
+                "Parents": [{"Name": f"Parent {i % 50}"}, {"Name": f"Parent {i % 7}"}],
+                "Aliases": [{"Name": f"Alias {i}"}],
+                "Categories": [{"Name": f"Category {i % 20}"}],
+            }
+            for i in range(labels)
+        ],
+    }
+
+
+def timed(fn, payload, repeat: int) -> float:
+    fn(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(payload)
+    return (time.perf_counter() - started) / repeat
+
+
+def main(sizes: list[int], repeat: int) -> None:
+    from app.services.analysis import extract_strings
+
+    print(f"{'labels':>8} {'recursive':>12} {'iterative':>12} {'speedup':>8}")
+    for labels in sizes:
+        payload = label_payload(labels)
+        assert extract_strings(payload) == recursive_extract_strings(payload), "extractors disagree"
+        old = timed(recursive_extract_strings, payload, repeat)
+        new = timed(extract_strings, payload, repeat)
+        print(f"{labels:>8} {old * 1000:>9.2f} ms {new * 1000:>9.2f} ms {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--labels", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    configure_env()
+    main(args.labels, args.repeat)
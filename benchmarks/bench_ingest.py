@@ -0,0 +1,75 @@
+"""
+Ingest a synthetic NHS job feed: a cold load, an identical re-run (all
+unchanged) and a refresh where a tenth of the postings changed.
+
+    python -m benchmarks.bench_ingest --jobs 100000
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import configure_env
+
+
+def synthetic_feed(count: int, changed_every: int = 0) -> str:
+    rng = random.Random(42)
+    today = date.today()
+    lines = []
+    for i in range(count):
+        salary = f"£{rng.randint(24, 90)},000"
+        if changed_every and i % changed_every == 0:
+            salary += " (revised)"
+        lines.append(json.dumps({
+            "title": f"{rng.choice(['Staff Nurse', 'Healthcare Assistant', 'Radiographer', 'Pharmacist'])} {i}",
+            "date_posted": (today - timedelta(days=i % 30)).isoformat(),
+            "salary": salary,
+            "contract": rng.choice(["Permanent", "Fixed term", "Bank"]),
+            "reference_number": f"SYN-{i:08d}",
+            "address": f"{rng.choice(['Leeds', 'York', 'Hull', 'Bradford'])} General Hospital",
+            "closing_date": (today + timedelta(days=i % 60)).isoformat(),
+            "sponsored": bool(i % 3 == 0),
+            "link": f"https://example.invalid/jobs/{i}",
+        }))
+    return "\n".join(lines)
+
+
+async def main(count: int, batch_size: int) -> None:
+    from sqlmodel import SQLModel
+
+    from app.db.session import AsyncSessionLocal, engine
+    from app.services.ingest import ingest_jobs
+
+    engine.echo = False
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    runs = (
+        ("cold load", synthetic_feed(count)),
+        ("identical re-run", synthetic_feed(count)),
+        ("10% changed", synthetic_feed(count, changed_every=10)),
+    )
+    try:
+        for label, feed in runs:
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                result = await ingest_jobs(db, io.StringIO(feed), "jsonl", batch_size)
+                elapsed = time.perf_counter() - started
+            print(
+                f"{label:<18} {elapsed:>7.2f} s  {count / elapsed:>9.0f} rows/s  "
+                f"inserted={result.inserted} updated={result.updated} unchanged={result.unchanged}"
+            )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    configure_env()
+    asyncio.run(main(args.jobs, args.batch_size))
@@ -0,0 +1,72 @@
+"""
+Per-row cost of rendering a 100-job page: the old ORM -> __dict__ -> JobOut ->
+jsonable_encoder -> json path against column rows -> dicts -> orjson.
+
+    python -m benchmarks.bench_job_serialization --rows 100 --iterations 2000
+"""
+import argparse
+import json
+import time
+import uuid
+from collections import namedtuple
+from datetime import date, timedelta
+
+from benchmarks.common import configure_env
+
+
+def timed(label: str, fn, iterations: int, rows: int) -> None:
+    fn()  # warm caches
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    per_page = elapsed / iterations
+    print(f"{label:<22} {per_page * 1e6:>9.1f} us/page  {per_page / rows * 1e6:>7.2f} us/row")
+
+
+def main(rows: int, iterations: int) -> None:
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+
+    from app.api.v1.jobs import JobOut
+    from app.models.jobs import NHSJob
+    from app.services.jobs import JOB_OUT_COLUMNS, serialize_job_rows
+
+    today = date.today()
+    values = [
+        dict(
+            id=uuid.uuid4(), title=f"Staff Nurse {i}", date_posted=today - timedelta(days=i % 14),
+            salary="£28,407 to £34,581 a year", contract="Permanent", reference_number=f"REF-{i:06d}",
+            address="Leeds General Infirmary, Great George Street, Leeds", closing_date=today + timedelta(days=i % 21),
+            sponsored=bool(i % 2), link=f"https://example.invalid/jobs/{i}",
+        )
+        for i in range(rows)
+    ]
+    orm_jobs = [NHSJob(**v) for v in values]
+    Row = namedtuple("Row", [column.key for column in JOB_OUT_COLUMNS])
+    column_rows = [Row(**{key: v[key] for key in Row._fields}) for v in values]
+
+    def old_path():
+        job_list = []
+        for job in orm_jobs:
+            job_dict = job.__dict__.copy()
+            job_dict["date_posted"] = job.date_posted.strftime("%d %B %Y")
+            job_dict["closing_date"] = job.closing_date.strftime("%d %B %Y")
+            job_dict.pop("_sa_instance_state", None)
+            job_list.append(JobOut(**job_dict))
+        json.dumps(jsonable_encoder({"total": rows, "jobs": job_list})).encode()
+
+    def fast_path():
+        orjson.dumps({"total": rows, "jobs": serialize_job_rows(column_rows)})
+
+    timed("ORM + JobOut + json", old_path, iterations, rows)
+    timed("columns + orjson", fast_path, iterations, rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    configure_env()
+    main(args.rows, args.iterations)
@@ -0,0 +1,57 @@
+"""
+/api/jobs/all latency on its own and while a login storm is running, with
+bcrypt in the password pool and inline on the event loop.
+
+    python -m benchmarks.bench_login_storm --requests 500 --logins 8
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import app_client, configure_env, print_row, run_load, signup_and_login
+
+
+async def main(total: int, concurrency: int, login_workers: int) -> None:
+    from app.core.security import password_pool
+
+    async with app_client() as client:
+        headers = await signup_and_login(client)
+        credentials = {"email": "storm@example.com", "password": "benchmark"}
+        await client.post("/api/auth/signup", json=credentials)
+
+        async def list_jobs():
+            response = await client.get("/api/jobs/all", headers=headers)
+            response.raise_for_status()
+
+        async def login_storm(stop: asyncio.Event):
+            while not stop.is_set():
+                await client.post("/api/auth/login", json=credentials)
+
+        async def under_storm() -> dict[str, float]:
+            stop = asyncio.Event()
+            storm = [asyncio.create_task(login_storm(stop)) for _ in range(login_workers)]
+            try:
+                return await run_load(list_jobs, total, concurrency)
+            finally:
+                stop.set()
+                await asyncio.gather(*storm)
+
+        await run_load(list_jobs, min(total, 100), concurrency)  # warm-up
+        print_row("idle", await run_load(list_jobs, total, concurrency))
+        print_row("login storm, process pool", await under_storm())
+
+        workers = password_pool.max_workers
+        password_pool.max_workers = 0
+        try:
+            print_row("login storm, inline bcrypt", await under_storm())
+        finally:
+            password_pool.max_workers = workers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login loops")
+    args = parser.parse_args()
+    configure_env()
+    asyncio.run(main(args.requests, args.concurrency, args.logins))
@@ -0,0 +1,61 @@
+"""
+Cost of building presigned URLs for a 1,000-image listing: a new client per
+URL (the old behaviour), the shared client with a cold cache, and a warm cache.
+Signing is local, so no network or AWS account is needed.
+
+    python -m benchmarks.bench_presign --images 1000
+"""
+import argparse
+import time
+
+from benchmarks.common import configure_env
+
+
+def timed(label: str, fn, count: int) -> None:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:>9.2f} ms total  {elapsed / count * 1e6:>8.1f} us/url")
+
+
+def main(count: int) -> None:
+    import boto3
+
+    from app.core.config import settings
+    from app.services.aws import AWSClients
+    from app.services.presign import PresignedUrlCache
+
+    keys = [f"blobs/{i % 256:02x}/{i:064x}" for i in range(count)]
+    aws = AWSClients()
+    urls = PresignedUrlCache(aws)
+    aws.s3  # client construction is not part of the listing cost
+
+    def client_per_url(sample: list[str]):
+        for key in sample:
+            client = boto3.client(
+                "s3",
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION,
+            )
+            client.generate_presigned_url(
+                "get_object", Params={"Bucket": settings.AWS_S3_BUCKET_NAME, "Key": key}, ExpiresIn=3600
+            )
+
+    def listing():
+        for key in keys:
+            urls.get_url(key)
+
+    sample = keys[: max(1, count // 10)]
+    timed(f"client per url ({len(sample)} urls)", lambda: client_per_url(sample), len(sample))
+    timed("shared client, cold cache", listing, count)
+    timed("shared client, warm cache", listing, count)
+    aws.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=1000)
+    args = parser.parse_args()
+    configure_env()
+    main(args.images)
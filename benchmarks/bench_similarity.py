@@ -0,0 +1,73 @@
+"""
+Near-duplicate query latency over a large HammingIndex: random 64-bit hashes
+plus a few planted near-duplicates of each query, checked against a linear
+scan of every hash.
+
+    python -m benchmarks.bench_similarity --hashes 1000000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.common import configure_env
+
+
+def flip_bits(value: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def main(count: int, queries: int, distances: list[int], seed: int) -> None:
+    from app.services.similarity import HammingIndex
+
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(count)]
+    probes = [rng.getrandbits(64) for _ in range(queries)]
+    # Each query gets near-duplicates at a spread of distances
+    for i, probe in enumerate(probes):
+        for j, bits in enumerate((0, 2, 5, 8, 12)):
+            hashes[(i * 5 + j) % count] = flip_bits(probe, bits, rng)
+
+    started = time.perf_counter()
+    index = HammingIndex()
+    for key, value in enumerate(hashes):
+        index.add(key, value)
+    print(f"built index of {len(index):,} hashes in {time.perf_counter() - started:.1f} s")
+
+    for max_distance in distances:
+        latencies, found = [], 0
+        for probe in probes:
+            started = time.perf_counter()
+            matches = index.search(probe, max_distance)
+            latencies.append(time.perf_counter() - started)
+            found += len(matches)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(
+            f"max_distance={max_distance:<3} p50 {statistics.median(latencies) * 1000:8.3f} ms"
+            f"  p95 {p95 * 1000:8.3f} ms  matches/query {found / len(probes):.1f}"
+        )
+
+    # Correctness and the cost being avoided: a full scan for a handful of queries
+    sample = probes[:5]
+    started = time.perf_counter()
+    for probe in sample:
+        expected = sorted(
+            key for key, value in enumerate(hashes) if (value ^ probe).bit_count() <= max(distances)
+        )
+        assert sorted(key for _, key in index.search(probe, max(distances))) == expected, "index missed matches"
+    scan = (time.perf_counter() - started) / len(sample)
+    print(f"linear scan           {scan * 1000:8.3f} ms/query (results match)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hashes", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distances", type=int, nargs="+", default=[4, 8, 10, 12])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    configure_env()
+    main(args.hashes, args.queries, args.distances, args.seed)
@@ -0,0 +1,82 @@
+"""
+Cold-start cost: how long `import app.main` takes in a fresh interpreter, and
+time-to-first-request for a uvicorn process, from spawn until GET / answers.
+The database is migrated once up front, as a deploy would, so each boot only
+checks the schema version.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.common import configure_env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_request(timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before serving a request")
+                time.sleep(0.01)
+        raise TimeoutError("no response from uvicorn")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def migrate() -> None:
+    from app.db.migrate import upgrade
+    from app.db.session import engine
+
+    async def run():
+        try:
+            await upgrade(engine)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(f"{label:<24} median {statistics.median(samples) * 1000:>8.1f} ms  min {min(samples) * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    configure_env(DB_SCHEMA_MODE="check", ANALYSIS_WORKER_ENABLED="false")
+    migrate()
+    time_import()  # the first run pays for writing .pyc files
+    report("import app.main", [time_import() for _ in range(args.runs)])
+    report("time to first request", [time_first_request() for _ in range(args.runs)])
@@ -0,0 +1,81 @@
+"""
+EXPLAIN regression check for the /api/jobs/all listing query. Seeds a user with
+actions, then fails (exit 1) unless the planner answers the per-user exclusion
+from the user_job_actions indexes instead of scanning the table.
+
+    python -m benchmarks.check_job_indexes
+"""
+import asyncio
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import configure_env
+
+
+async def seed(session, jobs: int, actions: int):
+    from app.models import JobActionEnum, NHSJob, User, UserJobAction
+
+    user = User(username="explain", email=f"explain-{uuid.uuid4().hex}@example.com", hashed_password="x")
+    session.add(user)
+    rows = [
+        NHSJob(
+            title=f"Job {i}", date_posted=date.today(), salary="", contract="", reference_number=f"EXPLAIN-{uuid.uuid4().hex}",
+            address="", closing_date=date.today() + timedelta(days=i % 90), sponsored=bool(i % 2), link="",
+        )
+        for i in range(jobs)
+    ]
+    session.add_all(rows)
+    await session.flush()
+    session.add_all(
+        UserJobAction(user_id=user.id, job_id=job.id, action=JobActionEnum.IGNORED)
+        for job in rows[:actions]
+    )
+    await session.commit()
+    return user.id
+
+
+async def main() -> int:
+    from sqlalchemy import text
+
+    from app.db.migrate import upgrade
+    from app.db.session import AsyncSessionLocal, engine
+    from app.services.jobs import available_jobs_query
+
+    engine.echo = False
+    # The migrations, not the models, so the indexes checked are the ones deployed
+    await upgrade(engine)
+
+    try:
+        async with AsyncSessionLocal() as session:
+            user_id = await seed(session, jobs=2000, actions=500)
+            query = available_jobs_query(user_id, now=datetime.now())
+            dialect = session.bind.dialect
+            sql = str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+            if dialect.name == "postgresql":
+                await session.execute(text("ANALYZE user_job_actions"))
+                await session.execute(text("ANALYZE nhs_jobs"))
+                # Tiny seeded tables would otherwise always be seq-scanned; we only care that the index is usable
+                await session.execute(text("SET LOCAL enable_seqscan = off"))
+                result = await session.execute(text(f"EXPLAIN {sql}"))
+                plan = "\n".join(row[0] for row in result)
+                ok = "uq_user_job_actions_user_job" in plan or "ix_user_job_actions_user_action_timestamp" in plan
+            else:
+                result = await session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+                plan = "\n".join(row[-1] for row in result)
+                ok = any(
+                    "user_job_actions" in line and "INDEX" in line
+                    for line in plan.splitlines()
+                ) and "SCAN user_job_actions" not in plan
+    finally:
+        await engine.dispose()
+
+    print(plan)
+    print("OK: exclusion uses a user_job_actions index" if ok else "FAIL: user_job_actions is scanned")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    configure_env()
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,102 @@
+"""
+Shared helpers for the benchmark scripts. They boot `app.main:app` in-process
+against a throwaway SQLite database unless DBCONNECTIONSTRING is already set.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable
+
+_DEFAULT_ENV = {
+    "SECRET_KEY": "benchmark-secret",
+    "JWT_ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "AWS_S3_BUCKET_NAME": "benchmark-bucket",
+    "CORS_ORIGINS": "http://localhost:3000",
+    # Throwaway databases are migrated by the app itself on startup
+    "DB_SCHEMA_MODE": "migrate",
+}
+
+
+def configure_env(**overrides: str) -> None:
+    """Must run before anything under `app` is imported."""
+    for key, value in _DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    if "DBCONNECTIONSTRING" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+        os.environ["DBCONNECTIONSTRING"] = f"sqlite+aiosqlite:///{path}"
+    os.environ.update(overrides)
+
+
+@asynccontextmanager
+async def app_client():
+    import httpx
+    from app.db.session import engine
+    from app.main import app
+
+    engine.echo = False
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                yield client
+    finally:
+        # aiosqlite connections run on non-daemon threads that would keep the process alive
+        await engine.dispose()
+
+
+async def signup_and_login(client, email: str = "bench@example.com", password: str = "benchmark") -> dict[str, str]:
+    await client.post("/api/auth/signup", json={"email": email, "password": password})
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_load(
+    request: Callable[[], Awaitable[Any]],
+    total: int,
+    concurrency: int,
+) -> dict[str, float]:
+    """Fire `total` calls with at most `concurrency` in flight and summarise latencies."""
+    latencies: list[float] = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed)
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict[str, float]:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else 0.0
+
+    return {
+        "requests": len(ordered),
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def print_row(label: str, stats: dict[str, float]) -> None:
+    print(
+        f"{label:<28} {stats['requests']:>7.0f} req  {stats['rps']:>9.1f} req/s  "
+        f"p50 {stats['p50_ms']:>7.2f} ms  p95 {stats['p95_ms']:>7.2f} ms  p99 {stats['p99_ms']:>7.2f} ms"
+    )
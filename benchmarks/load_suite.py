@@ -0,0 +1,336 @@
+"""
+Reproducible load test of the main API paths. Boots `app.main:app` in-process
+against SQLite (or the database in DBCONNECTIONSTRING, which should be empty)
+with S3 and DynamoDB stood in by moto, seeds synthetic users, jobs, job
+actions, images and analyses from a fixed random seed, then drives each
+scenario at the given concurrency.
+
+Results are written as JSON (p50/p95/p99, mean, throughput and error count
+per scenario). Budgets from benchmarks/budgets.json are checked against them
+and the run exits 1 if any is exceeded, so it can gate CI.
+
+    python -m benchmarks.load_suite --concurrency 16 --requests 300 --output results.json
+    python -m benchmarks.load_suite --scenarios login,jobs_search --storage s3
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable
+
+from benchmarks.common import configure_env, run_load
+
+PASSWORD = "load-test-password"
+SEARCH_TERMS = ("nurse", "staff", "radiographer", "pharmacist", "leeds", "york", "assistant")
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(__file__), "budgets.json")
+
+
+@dataclass
+class Fixture:
+    users: list[dict[str, Any]] = field(default_factory=list)  # email, headers, image_ids
+    jobs: int = 0
+
+
+def png(rng: random.Random, size: int = 96) -> bytes:
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(4):
+        x, y = rng.randrange(size), rng.randrange(size)
+        draw.rectangle((x, y, x + size // 4, y + size // 4), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def create_aws_resources() -> None:
+    from app.core.config import settings
+    from app.services.aws import AWSClients
+
+    aws = AWSClients()
+    try:
+        aws.s3.create_bucket(Bucket=settings.AWS_S3_BUCKET_NAME)
+        aws.dynamodb.create_table(
+            TableName=settings.ANALYSIS_TABLE_NAME,
+            KeySchema=[{"AttributeName": "image-id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "image-id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    finally:
+        aws.close()
+
+
+async def seed_database(rng: random.Random, run: str, users: int, jobs: int, actions: int) -> list[str]:
+    from app.core.security import get_password_hash
+    from app.db.session import AsyncSessionLocal
+    from app.models import JobActionEnum, NHSJob, User, UserJobAction
+
+    # One bcrypt hash shared by every user; hashing per user would dominate seeding
+    hashed = get_password_hash(PASSWORD)
+    emails = [f"load-{run}-{i}@example.com" for i in range(users)]
+    today = date.today()
+    async with AsyncSessionLocal() as db:
+        people = [User(username=f"load-{i}", email=email, hashed_password=hashed) for i, email in enumerate(emails)]
+        db.add_all(people)
+        rows = [
+            NHSJob(
+                title=f"{rng.choice(['Staff Nurse', 'Healthcare Assistant', 'Radiographer', 'Pharmacist'])} {i}",
+                date_posted=today - timedelta(days=i % 30),
+                salary=f"£{rng.randint(24, 90)},000",
+                contract=rng.choice(["Permanent", "Fixed term", "Bank"]),
+                reference_number=f"LOAD-{run}-{i:08d}",
+                address=f"{rng.choice(['Leeds', 'York', 'Hull', 'Bradford'])} General Hospital",
+                closing_date=today + timedelta(days=1 + i % 60),
+                sponsored=i % 3 == 0,
+                link=f"https://example.invalid/jobs/{i}",
+            )
+            for i in range(jobs)
+        ]
+        db.add_all(rows)
+        await db.flush()
+        job_ids = [job.id for job in rows]
+        choices = list(JobActionEnum)
+        for person in people:
+            db.add_all(
+                UserJobAction(user_id=person.id, job_id=job_id, action=rng.choice(choices))
+                for job_id in rng.sample(job_ids, min(actions, len(job_ids)))
+            )
+        await db.commit()
+    return emails
+
+
+async def seed_images(client, fixture: Fixture, rng: random.Random, images: int) -> None:
+    """Upload through the API so blobs, hashes and analysis rows exist as they would in production."""
+    from app.core.config import settings
+    from app.services.aws import AWSClients
+
+    aws = AWSClients()
+    try:
+        for user in fixture.users:
+            for _ in range(images):
+                response = await client.post(
+                    "/api/image/upload-image",
+                    headers=user["headers"],
+                    files={"file": ("seed.png", png(rng), "image/png")},
+                )
+                response.raise_for_status()
+                user["image_ids"].append(response.json()["id"])
+            items = [
+                {"PutRequest": {"Item": {
+                    "image-id": {"S": image_id},
+                    "results": {"M": {"Labels": {"L": [
+                        {"M": {"Name": {"S": rng.choice(["Cat", "Dog", "Tree", "Car"])},
+                               "Categories": {"L": [{"M": {"Name": {"S": "Everyday Objects"}}}]}}},
+                    ]}}},
+                }}}
+                for image_id in user["image_ids"]
+            ]
+            for start in range(0, len(items), 25):
+                await aws.run(
+                    aws.dynamodb.batch_write_item,
+                    RequestItems={settings.ANALYSIS_TABLE_NAME: items[start:start + 25]},
+                )
+    finally:
+        aws.close()
+
+
+def scenarios(client, fixture: Fixture, rng: random.Random, deep_skip: int) -> dict[str, Callable[[], Awaitable[Any]]]:
+    def user() -> dict[str, Any]:
+        return rng.choice(fixture.users)
+
+    async def login():
+        return await client.post("/api/auth/login", json={"email": user()["email"], "password": PASSWORD})
+
+    async def jobs_search():
+        params = {"search": rng.choice(SEARCH_TERMS), "sort": "relevance", "limit": 20}
+        return await client.get("/api/jobs/all", params=params, headers=user()["headers"])
+
+    async def jobs_deep_page():
+        params = {"skip": rng.randrange(deep_skip // 2, deep_skip + 1), "limit": 20, "sort": rng.choice(["asc", "desc"])}
+        return await client.get("/api/jobs/all", params=params, headers=user()["headers"])
+
+    async def upload():
+        files = {"file": ("load.png", png(rng), "image/png")}
+        return await client.post("/api/image/upload-image", headers=user()["headers"], files=files)
+
+    async def list_my_images():
+        return await client.get("/api/image/images", headers=user()["headers"])
+
+    async def image_analysis():
+        owner = user()
+        return await client.get(f"/api/image/get-image-analysis/{rng.choice(owner['image_ids'])}", headers=owner["headers"])
+
+    return {
+        "login": login,
+        "jobs_search": jobs_search,
+        "jobs_deep_page": jobs_deep_page,
+        "upload": upload,
+        "list_my_images": list_my_images,
+        "image_analysis": image_analysis,
+    }
+
+
+async def run_scenario(request: Callable[[], Awaitable[Any]], total: int, concurrency: int) -> dict[str, Any]:
+    errors: dict[str, int] = {}
+
+    async def checked():
+        try:
+            response = await request()
+        except Exception as e:
+            # The in-process transport re-raises unhandled app errors instead of answering 500
+            outcome = type(e).__name__
+        else:
+            if response.status_code < 400:
+                return
+            outcome = str(response.status_code)
+        errors[outcome] = errors.get(outcome, 0) + 1
+
+    stats = {key: round(value, 2) for key, value in (await run_load(checked, total, concurrency)).items()}
+    stats["errors"] = sum(errors.values())
+    stats["error_statuses"] = errors
+    return stats
+
+
+def check_budgets(results: dict[str, dict[str, Any]], budgets: dict[str, Any], database: str) -> list[str]:
+    """Budgets per scenario: *_ms are upper bounds, min_rps a lower bound, max_error_rate a fraction."""
+    overrides = budgets.get("databases", {}).get(database, {})
+    violations = []
+    for name, stats in results.items():
+        budget = {
+            **budgets.get("default", {}), **budgets.get(name, {}),
+            **overrides.get("default", {}), **overrides.get(name, {}),
+        }
+        for key, limit in budget.items():
+            if key == "min_rps":
+                if stats["rps"] < limit:
+                    violations.append(f"{name}: {stats['rps']:.1f} req/s below {limit}")
+            elif key == "max_error_rate":
+                rate = stats["errors"] / stats["requests"] if stats["requests"] else 0.0
+                if rate > limit:
+                    violations.append(f"{name}: error rate {rate:.3f} above {limit}")
+            elif stats[key] > limit:
+                violations.append(f"{name}: {key} {stats[key]:.2f} above {limit}")
+    return violations
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    from app.db.migrate import upgrade
+    from app.db.session import engine
+    from benchmarks.common import app_client
+
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    engine.echo = False
+    try:
+        await upgrade(engine)
+        emails = await seed_database(rng, run_id, args.users, args.jobs, args.actions)
+    finally:
+        # Seeding failures must not leave aiosqlite threads keeping the process alive
+        await engine.dispose()
+    create_aws_resources()
+
+    fixture = Fixture(jobs=args.jobs)
+
+    async with app_client() as client:
+        for email in emails:
+            response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+            response.raise_for_status()
+            token = response.json()["access_token"]
+            fixture.users.append({"email": email, "headers": {"Authorization": f"Bearer {token}"}, "image_ids": []})
+        await seed_images(client, fixture, rng, args.images)
+        seeded = time.perf_counter() - started
+
+        available = scenarios(client, fixture, rng, deep_skip=max(0, args.jobs - args.actions - 20))
+        selected = args.scenarios or list(available)
+        unknown = set(selected) - set(available)
+        if unknown:
+            raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        results = {}
+        for name in selected:
+            # A short unmeasured warm-up fills per-process caches and connection pools
+            await run_scenario(available[name], min(args.concurrency, args.requests), args.concurrency)
+            results[name] = await run_scenario(available[name], args.requests, args.concurrency)
+            print(
+                f"{name:<16} {results[name]['rps']:>8.1f} req/s  p50 {results[name]['p50_ms']:>8.2f} ms  "
+                f"p95 {results[name]['p95_ms']:>8.2f} ms  p99 {results[name]['p99_ms']:>8.2f} ms  "
+                f"errors {results[name]['errors']}",
+                file=sys.stderr,
+            )
+
+    return {
+        "config": {
+            "seed": args.seed,
+            "users": args.users,
+            "jobs": args.jobs,
+            "actions_per_user": args.actions,
+            "images_per_user": args.images,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "storage": args.storage,
+            "database": engine.dialect.name,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "seed_seconds": round(seeded, 2),
+        "scenarios": results,
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    from moto import mock_aws
+
+    with mock_aws():
+        report = asyncio.run(run(args))
+
+    budgets = {}
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+    violations = check_budgets(report["scenarios"], budgets, report["config"]["database"])
+    report["budget_violations"] = violations
+    report["passed"] = not violations
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for violation in violations:
+        print(f"BUDGET EXCEEDED {violation}", file=sys.stderr)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--actions", type=int, default=200, help="job actions per user")
+    parser.add_argument("--images", type=int, default=10, help="images per user")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", type=lambda value: [s for s in value.split(",") if s], default=None)
+    parser.add_argument("--storage", choices=("local", "s3"), default="local", help="where uploads are stored (s3 is moto)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS, help="JSON budgets file, '' to skip the check")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    configure_env(
+        UPLOAD_DIR=tempfile.mkdtemp(prefix="load-uploads-"),
+        # Analyses are seeded into DynamoDB directly; the worker would only add noise to the timings
+        ANALYSIS_WORKER_ENABLED="false",
+        DB_SLOW_QUERY_MS="100000",
+        **({"ENV": "production"} if args.storage == "s3" else {}),
+    )
+    sys.exit(main(args))